@@ -1,5 +1,11 @@
 import frappe
+import base64
+import json
 from datetime import datetime, timedelta, time
+from frappe.model.db_query import DatabaseQuery
+from frappe.utils import cint
+from salon.utilities.availability import get_employee_slots, get_shift_setting
+from salon.utilities.slots import get_materialized_slots
 
 @frappe.whitelist()
 def update_schedulers():
@@ -20,132 +26,123 @@ def update_schedulers():
 
 @frappe.whitelist()
 def get_available_times(current_appointment_id: str, date: str, department: str, employee: str):
-
-    def parse_time_field(time_value):
-        """Converts a time string or timedelta object into a time object."""
-        if isinstance(time_value, str):
-            # Assume string format is 'HH:MM:SS'
-            return datetime.strptime(time_value, "%H:%M:%S").time()
-        elif isinstance(time_value, (timedelta, time)):
-            # If it's a timedelta, convert it to seconds, then to HH:MM:SS for replacement
-            # If it's a time object, return it directly
-            if isinstance(time_value, timedelta):
-                total_seconds = int(time_value.total_seconds())
-                hours = total_seconds // 3600
-                minutes = (total_seconds % 3600) // 60
-                seconds = total_seconds % 60
-                return time(hours, minutes, seconds)
-            return time_value
-        else:
-            raise TypeError(f"Unsupported time type: {type(time_value)}")
-        
-    def get_concurrent_guests(employee: str, check_datetime: datetime):
-        """Calculates the number of guests already booked concurrently with the proposed slot."""
-        
-        proposed_start = check_datetime
-        # proposed_end = proposed_start + timedelta(seconds=duration_seconds)
-
-        full_datetime_str = proposed_start.strftime("%Y-%m-%d %H:%M:%S")
-
-        # Fetch existing appointments for the employee on that date
-        concurrent_count = frappe.db.count(
-            "Appointment",
-            filters={
-                "name": ["!=", current_appointment_id],
-                "employee": employee,
-                "scheduled_time": full_datetime_str,
-                "status": "Open",
-            }
-        )
-
-        return concurrent_count
-    
-
-    ## Convert date string to datetime
-    if isinstance(date, str):
-        date_obj = datetime.strptime(date, "%Y-%m-%d")
-    else:
-        # If date is already a datetime object
-        date_obj = date
-
-    weekday = date_obj.weekday()
-
-
-    ## Get employee shift settings
-    filters = {
-        "employee": employee,
-        "department": department,
-        "weekday": str(weekday),
-    }
-    appointment_settings = frappe.get_all(
-        "Appointment Setting",
-        filters=filters,
-        fields=["name", "customers_capacity", "duration", "from", "to"]
+    ## New bookings read the precomputed slot table; re-scheduling an existing
+    ## appointment has to exclude its own booking, so it is computed live.
+    if not current_appointment_id or current_appointment_id == "None":
+        slots = get_materialized_slots(employee, department, date)
+        if slots:
+            return slots
+
+    return get_employee_slots(
+        employee=employee,
+        department=department,
+        date=date,
+        exclude=current_appointment_id,
     )
 
-    if not appointment_settings:
-        return {"times": []}
-    
-    setting = appointment_settings[0]
 
-    duration_seconds = int(setting.get("duration", 1800))
-    customers_capacity = int(setting.get("customers_capacity"))
+def encode_cursor(row) -> str:
+    key = [str(row.selected_date), str(row.scheduled_time), row.name]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> list:
+    return json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+
+
+def list_appointments(
+    customer: str | None = None,
+    from_date: str | None = None,
+    to_date: str | None = None,
+    employee: str | None = None,
+    after: str | None = None,
+    page_length: int = 0,
+) -> dict:
+    """
+    Lists the Open appointments the user may read, with the employee name joined in, in one query.
+
+    Rows are ordered by (selected_date, scheduled_time, name); pass the returned
+    `next_cursor` as `after` to fetch the following page. `page_length` 0 returns all rows.
+    """
+    frappe.has_permission("Appointment", "read", throw=True)
+
+    conditions = ["`tabAppointment`.status = 'Open'"]
+    values = {}
+
+    if customer:
+        conditions.append("`tabAppointment`.customer = %(customer)s")
+        values["customer"] = customer
+    if employee:
+        conditions.append("`tabAppointment`.employee = %(employee)s")
+        values["employee"] = employee
+    if from_date:
+        conditions.append("`tabAppointment`.selected_date >= %(from_date)s")
+        values["from_date"] = from_date
+    if to_date:
+        conditions.append("`tabAppointment`.selected_date <= %(to_date)s")
+        values["to_date"] = to_date
+    if after:
+        values["after_date"], values["after_time"], values["after_name"] = decode_cursor(after)
+        conditions.append("""(
+            `tabAppointment`.selected_date > %(after_date)s
+            OR (`tabAppointment`.selected_date = %(after_date)s AND (
+                `tabAppointment`.scheduled_time > %(after_time)s
+                OR (`tabAppointment`.scheduled_time = %(after_time)s AND `tabAppointment`.name > %(after_name)s)
+            ))
+        )""")
+
+    ## User Permissions and permission query conditions, as frappe.get_list applies them
+    match_conditions = DatabaseQuery("Appointment").build_match_conditions()
+    if match_conditions:
+        conditions.append("({})".format(match_conditions.replace("%", "%%")))
+
+    page_length = cint(page_length)
+    values["page_length"] = page_length + 1
+
+    appointments = frappe.db.sql("""
+        SELECT
+            `tabAppointment`.name,
+            `tabAppointment`.selected_date,
+            `tabAppointment`.department,
+            IFNULL(emp.employee_name, `tabAppointment`.employee) AS employee,
+            `tabAppointment`.scheduled_time,
+            `tabAppointment`.scheduled_end_time
+        FROM
+            `tabAppointment`
+        LEFT JOIN
+            `tabEmployee` AS emp ON emp.name = `tabAppointment`.employee
+        WHERE
+            {conditions}
+        ORDER BY
+            `tabAppointment`.selected_date ASC, `tabAppointment`.scheduled_time ASC, `tabAppointment`.name ASC
+        {limit}
+    """.format(
+        conditions=" AND ".join(conditions),
+        limit="LIMIT %(page_length)s" if page_length else "",
+    ), values, as_dict=True)
+
+    next_cursor = None
+    if page_length and len(appointments) > page_length:
+        appointments = appointments[:page_length]
+        next_cursor = encode_cursor(appointments[-1])
+
+    for app in appointments:
+        del app["selected_date"]
+
+    return {"appointments": appointments, "next_cursor": next_cursor}
 
 
-    ## Parse shift start and end times
-    try:
-        start_time_obj = parse_time_field(setting["from"])
-        end_time_obj = parse_time_field(setting["to"])
-    except ValueError:
-        return {"error": "Invalid time format in Appointment Setting."}
-    
-
-    # Combine the date object with the shift times
-    start_datetime = date_obj.replace(
-        hour=start_time_obj.hour, 
-        minute=start_time_obj.minute, 
-        second=start_time_obj.second, 
-        microsecond=0
-    )
-    end_datetime = date_obj.replace(
-        hour=end_time_obj.hour, 
-        minute=end_time_obj.minute, 
-        second=end_time_obj.second, 
-        microsecond=0
+@frappe.whitelist()
+def get_day_appointments(date: str, employee: str | None = None, after: str | None = None, page_length: int = 100):
+    """All Open appointments of a day for the reception desk, a page at a time."""
+    return list_appointments(
+        from_date=date,
+        to_date=date,
+        employee=employee,
+        after=after,
+        page_length=page_length,
     )
 
-    step = timedelta(seconds=duration_seconds)
-    available_times = []
-    current_time = start_datetime
-
-    
-    # Loop through the time range, stepping by the appointment duration
-    while current_time < end_datetime:
-        slot_end_time = current_time + step
-        
-        if slot_end_time > end_datetime:
-            break
-            
-        # --- Integration Step 2 & 3: Check Concurrent Bookings ---
-        # Determine how many guests are already booked in this specific slot
-        booked_count = get_concurrent_guests(
-            employee=employee, 
-            check_datetime=current_time,
-        )
-        
-        remaining_capacity = customers_capacity - booked_count
-
-        # --- Integration Step 4: Filtering ---
-        slot = {
-            "value": current_time.strftime("%H:%M:%S"),
-            "available": remaining_capacity > 0
-        }
-        available_times.append(slot)
-        
-        current_time += step
-        
-    return {"times": available_times, "duration": duration_seconds}
-
 
 @frappe.whitelist()
 def get_end_date(start_date: str, duration: int):
@@ -188,13 +185,4 @@ def set_package_appointments(
         department = service.item_group
 
     ## Get employee shift settings
-    filters = {
-        "employee": employee_id,
-        "department": department_id,
-        "weekday": str(weekday),
-    }
-    appointment_settings = frappe.get_all(
-        "Appointment Setting",
-        filters=filters,
-        fields=["name", "customers_capacity", "duration", "from", "to"]
-    )
\ No newline at end of file
+    appointment_setting = get_shift_setting(employee_id, department_id, weekday)
\ No newline at end of file
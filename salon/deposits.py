@@ -0,0 +1,526 @@
+import frappe
+from frappe.utils import add_days, cint, flt, getdate, now_datetime, nowdate
+
+RECONCILE_BATCH_SIZE = 500
+BALANCE_BATCH_SIZE = 1000
+
+
+def post_deposit_entry(
+	customer: str, amount: float, entry_type: str, voucher_type: str, voucher_no: str, posting_date=None
+) -> float | None:
+	"""
+	Appends the ledger entry and moves the customer's deposit balance by `amount`, both
+	under a lock on the customer row. Debits only apply while the balance covers them, so
+	concurrent checkouts can never take it below zero. Posting the same voucher and entry
+	type twice is a no-op, checked under the same lock.
+
+	:return: the balance after the entry, or None when the voucher was already posted
+	"""
+	amount = flt(amount)
+	if not amount:
+		return None
+
+	## Concurrent entries for the customer wait here and then read the committed balance
+	current = frappe.db.sql(
+		"""
+        SELECT IFNULL(deposit_balance, 0)
+        FROM `tabCustomer`
+        WHERE name = %s
+        FOR UPDATE
+    """,
+		customer,
+	)
+
+	if not current:
+		frappe.throw(f"Customer {customer} does not exist.", frappe.DoesNotExistError)
+
+	## A locking read sees entries committed after this transaction's snapshot was taken
+	if frappe.db.sql(
+		"""
+        SELECT name
+        FROM `tabCustomer Deposit Ledger Entry`
+        WHERE voucher_type = %(voucher_type)s
+            AND voucher_no = %(voucher_no)s
+            AND entry_type = %(entry_type)s
+        FOR UPDATE
+    """,
+		{"voucher_type": voucher_type, "voucher_no": voucher_no, "entry_type": entry_type},
+	):
+		return None
+
+	balance = flt(current[0][0]) + amount
+	if amount < 0 and balance < 0:
+		frappe.throw("Customer deposit balance is insufficient.")
+
+	entry = frappe.get_doc(
+		{
+			"doctype": "Customer Deposit Ledger Entry",
+			"customer": customer,
+			"posting_date": posting_date or nowdate(),
+			"entry_type": entry_type,
+			"amount": amount,
+			"balance_after": balance,
+			"voucher_type": voucher_type,
+			"voucher_no": voucher_no,
+		}
+	)
+	## The voucher is the document being submitted or cancelled; it may not be committed yet
+	entry.flags.ignore_links = True
+	try:
+		## The unique (voucher_type, voucher_no, entry_type) index is the last word on duplicates
+		entry.insert(ignore_permissions=True)
+	except (frappe.DuplicateEntryError, frappe.UniqueValidationError):
+		return None
+
+	frappe.db.sql(
+		"""
+        UPDATE `tabCustomer`
+        SET deposit_balance = %(balance)s
+        WHERE name = %(customer)s
+    """,
+		{"customer": customer, "balance": balance},
+	)
+
+	invalidate_deposit_snapshots(customer, entry.posting_date)
+
+	frappe.clear_document_cache("Customer", customer)
+
+	return balance
+
+
+def reverse_deposit_entries(voucher_type: str, voucher_no: str, posting_date=None):
+	"""Posts the opposite of every entry the voucher made, e.g. when it is cancelled."""
+	for entry in frappe.get_all(
+		"Customer Deposit Ledger Entry",
+		filters={"voucher_type": voucher_type, "voucher_no": voucher_no, "entry_type": ["!=", "Reversal"]},
+		fields=["customer", "amount"],
+	):
+		post_deposit_entry(
+			entry.customer, -flt(entry.amount), "Reversal", voucher_type, voucher_no, posting_date
+		)
+
+
+def get_ledger_mismatches(after: str = "", limit: int = RECONCILE_BATCH_SIZE) -> list:
+	"""Customers, by name after `after`, whose stored balance differs from the sum of their ledger."""
+	return frappe.db.sql(
+		"""
+        SELECT
+            c.name,
+            IFNULL(c.deposit_balance, 0) AS deposit_balance,
+            IFNULL(ledger.balance, 0) AS ledger_balance
+        FROM
+            `tabCustomer` AS c
+        LEFT JOIN (
+            SELECT
+                customer,
+                SUM(amount) AS balance
+            FROM
+                `tabCustomer Deposit Ledger Entry`
+            GROUP BY
+                customer
+        ) AS ledger ON ledger.customer = c.name
+        WHERE
+            c.name > %(after)s
+            AND ROUND(IFNULL(c.deposit_balance, 0), 2) != ROUND(IFNULL(ledger.balance, 0), 2)
+        ORDER BY
+            c.name
+        LIMIT %(limit)s
+    """,
+		{"after": after, "limit": limit},
+		as_dict=True,
+	)
+
+
+def reconcile_deposit_balances(batch_size: int = RECONCILE_BATCH_SIZE) -> list:
+	"""
+	Recomputes deposit balances from the ledger. Mismatches are found in bulk with one
+	aggregate query per batch, then each one is re-checked under the customer's row lock,
+	so a checkout that commits meanwhile is never overwritten.
+
+	:return: the corrected customers with their old and new balances
+	"""
+	corrected = []
+	last_name = ""
+
+	while True:
+		mismatches = get_ledger_mismatches(last_name, batch_size)
+		if not mismatches:
+			break
+
+		for mismatch in mismatches:
+			stored = flt(
+				frappe.db.sql(
+					"""
+                SELECT deposit_balance FROM `tabCustomer` WHERE name = %s FOR UPDATE
+            """,
+					mismatch.name,
+				)[0][0]
+			)
+			ledger = flt(
+				frappe.db.sql(
+					"""
+                SELECT SUM(amount) FROM `tabCustomer Deposit Ledger Entry` WHERE customer = %s LOCK IN SHARE MODE
+            """,
+					mismatch.name,
+				)[0][0]
+			)
+
+			if flt(stored, 2) != flt(ledger, 2):
+				frappe.db.sql(
+					"""
+                    UPDATE `tabCustomer` SET deposit_balance = %(balance)s WHERE name = %(customer)s
+                """,
+					{"customer": mismatch.name, "balance": ledger},
+				)
+				frappe.clear_document_cache("Customer", mismatch.name)
+				corrected.append({"customer": mismatch.name, "from": stored, "to": ledger})
+
+		frappe.db.commit()
+		last_name = mismatches[-1].name
+
+	if corrected:
+		frappe.log_error(
+			title="Customer Deposit Balances Reconciled",
+			message="\n".join(f"{c['customer']}: {c['from']} -> {c['to']}" for c in corrected),
+		)
+
+	return corrected
+
+
+def create_opening_entries(batch_size: int = RECONCILE_BATCH_SIZE):
+	"""Opens the ledger with each customer's current balance, for customers that have none yet."""
+	now = now_datetime()
+	while True:
+		customers = frappe.db.sql(
+			"""
+            SELECT
+                c.name,
+                c.deposit_balance
+            FROM
+                `tabCustomer` AS c
+            WHERE
+                IFNULL(c.deposit_balance, 0) != 0
+                AND NOT EXISTS (
+                    SELECT 1 FROM `tabCustomer Deposit Ledger Entry` AS l WHERE l.customer = c.name
+                )
+            ORDER BY
+                c.name
+            LIMIT %(limit)s
+        """,
+			{"limit": batch_size},
+			as_dict=True,
+		)
+
+		if not customers:
+			return
+
+		frappe.db.bulk_insert(
+			"Customer Deposit Ledger Entry",
+			fields=[
+				"name",
+				"creation",
+				"modified",
+				"owner",
+				"modified_by",
+				"customer",
+				"posting_date",
+				"entry_type",
+				"amount",
+				"balance_after",
+				"voucher_type",
+				"voucher_no",
+			],
+			values=[
+				(
+					frappe.generate_hash(length=10),
+					now,
+					now,
+					"Administrator",
+					"Administrator",
+					customer.name,
+					now.date(),
+					"Opening",
+					customer.deposit_balance,
+					customer.deposit_balance,
+					"Customer",
+					customer.name,
+				)
+				for customer in customers
+			],
+		)
+		frappe.db.commit()
+
+
+def allocate_deposit_advances(doc):
+	"""
+	Fills the invoice's advances with the customer's unallocated deposit Payment Entries,
+	oldest first, up to `deposit_used`, the deposit balance and the invoice total. Runs
+	before the first save instead of a set_advances() and a second save after insert, so
+	the totals are calculated here first; an invoice without a total gets no advances.
+
+	Deposits are read straight from the customer's Payment Entries (indexed on party), so
+	deposits made before the ledger existed, which only have an Opening entry, are found too.
+	"""
+	doc.calculate_taxes_and_totals()
+
+	balance = flt(frappe.db.get_value("Customer", doc.customer, "deposit_balance"))
+	remaining = min(flt(doc.deposit_used), balance, flt(doc.rounded_total or doc.grand_total))
+
+	deposits = frappe.db.sql(
+		"""
+        SELECT
+            pe.name,
+            pe.remarks,
+            pe.unallocated_amount,
+            pe.source_exchange_rate
+        FROM
+            `tabPayment Entry` AS pe
+        WHERE
+            pe.party_type = 'Customer'
+            AND pe.party = %(customer)s
+            AND pe.is_customer_deposit = 1
+            AND pe.docstatus = 1
+            AND pe.unallocated_amount > 0
+        ORDER BY
+            pe.posting_date, pe.name
+    """,
+		{"customer": doc.customer},
+		as_dict=True,
+	)
+
+	doc.set("advances", [])
+	for deposit in deposits:
+		if remaining <= 0:
+			break
+
+		allocated = min(flt(deposit.unallocated_amount), remaining)
+		doc.append(
+			"advances",
+			{
+				"reference_type": "Payment Entry",
+				"reference_name": deposit.name,
+				"remarks": deposit.remarks,
+				"advance_amount": flt(deposit.unallocated_amount),
+				"allocated_amount": allocated,
+				"ref_exchange_rate": flt(deposit.source_exchange_rate) or 1,
+			},
+		)
+		remaining -= allocated
+
+
+def invalidate_deposit_snapshots(customer: str, posting_date):
+	"""
+	Drops the customer's snapshots on or after a (backdated) entry's posting date. They no
+	longer include it, and balances are only ever a snapshot plus the entries after it.
+	Point-in-time reads fall back to the previous snapshot, and the next snapshot run
+	records the customer again.
+	"""
+	frappe.db.sql(
+		"""
+        DELETE FROM `tabCustomer Deposit Snapshot`
+        WHERE customer = %(customer)s
+            AND snapshot_date >= %(posting_date)s
+    """,
+		{"customer": customer, "posting_date": getdate(posting_date)},
+	)
+
+
+def take_deposit_snapshots(snapshot_date=None):
+	"""
+	Records the deposit balance as of `snapshot_date` (yesterday by default) for every
+	customer whose ledger moved since their previous snapshot, computed in one aggregate
+	query from that snapshot plus the entries posted after it. Customers without movement
+	keep their last snapshot, so point-in-time lookups never scan more than one
+	snapshot interval of ledger entries.
+	"""
+	snapshot_date = getdate(snapshot_date or add_days(nowdate(), -1))
+
+	balances = frappe.db.sql(
+		"""
+        SELECT
+            l.customer,
+            MAX(IFNULL(s.balance, 0)) + SUM(l.amount) AS balance
+        FROM
+            `tabCustomer Deposit Ledger Entry` AS l
+        LEFT JOIN (
+            SELECT
+                customer,
+                MAX(snapshot_date) AS snapshot_date
+            FROM
+                `tabCustomer Deposit Snapshot`
+            WHERE
+                snapshot_date <= %(snapshot_date)s
+            GROUP BY
+                customer
+        ) AS latest ON latest.customer = l.customer
+        LEFT JOIN `tabCustomer Deposit Snapshot` AS s
+            ON s.customer = latest.customer AND s.snapshot_date = latest.snapshot_date
+        WHERE
+            l.posting_date <= %(snapshot_date)s
+            AND l.posting_date > IFNULL(latest.snapshot_date, '1900-01-01')
+        GROUP BY
+            l.customer
+    """,
+		{"snapshot_date": snapshot_date},
+		as_dict=True,
+	)
+
+	now = now_datetime()
+	for i in range(0, len(balances), BALANCE_BATCH_SIZE):
+		frappe.db.bulk_insert(
+			"Customer Deposit Snapshot",
+			fields=[
+				"name",
+				"creation",
+				"modified",
+				"owner",
+				"modified_by",
+				"customer",
+				"snapshot_date",
+				"balance",
+			],
+			values=[
+				(
+					frappe.generate_hash(length=10),
+					now,
+					now,
+					"Administrator",
+					"Administrator",
+					row.customer,
+					snapshot_date,
+					row.balance,
+				)
+				for row in balances[i : i + BALANCE_BATCH_SIZE]
+			],
+			ignore_duplicates=True,
+		)
+		frappe.db.commit()
+
+	return len(balances)
+
+
+def get_balances_as_of(customers: list, as_of) -> dict:
+	"""
+	Deposit balances at the end of `as_of` for the customers: their latest snapshot on or
+	before the date plus the ledger entries posted after it, in one query per batch.
+	"""
+	balances = {}
+	for i in range(0, len(customers), BALANCE_BATCH_SIZE):
+		batch = tuple(customers[i : i + BALANCE_BATCH_SIZE])
+
+		rows = frappe.db.sql(
+			"""
+            SELECT
+                c.name AS customer,
+                IFNULL(s.balance, 0) + IFNULL((
+                    SELECT SUM(l.amount)
+                    FROM `tabCustomer Deposit Ledger Entry` AS l
+                    WHERE l.customer = c.name
+                        AND l.posting_date <= %(as_of)s
+                        AND l.posting_date > IFNULL(s.snapshot_date, '1900-01-01')
+                ), 0) AS balance
+            FROM
+                `tabCustomer` AS c
+            LEFT JOIN `tabCustomer Deposit Snapshot` AS s
+                ON s.customer = c.name
+                AND s.snapshot_date = (
+                    SELECT MAX(latest.snapshot_date)
+                    FROM `tabCustomer Deposit Snapshot` AS latest
+                    WHERE latest.customer = c.name AND latest.snapshot_date <= %(as_of)s
+                )
+            WHERE
+                c.name IN %(customers)s
+        """,
+			{"customers": batch, "as_of": getdate(as_of)},
+			as_dict=True,
+		)
+
+		balances.update({row.customer: flt(row.balance) for row in rows})
+
+	return balances
+
+
+@frappe.whitelist()
+def get_deposit_balance(customer: str, as_of: str | None = None) -> float:
+	"""Current deposit balance, read straight from the customer, or the balance at the end of `as_of`."""
+	frappe.has_permission("Customer", "read", customer, throw=True)
+
+	if not as_of:
+		return flt(frappe.db.get_value("Customer", customer, "deposit_balance"))
+
+	return get_balances_as_of([customer], as_of).get(customer, 0.0)
+
+
+@frappe.whitelist()
+def get_deposit_balances(as_of: str | None = None, after: str = "", page_length: int = 500) -> dict:
+	"""
+	Deposit balances of every customer with ledger activity, a page at a time by customer name,
+	current or as of a date.
+	"""
+	frappe.has_permission("Customer Deposit Ledger Entry", "read", throw=True)
+	page_length = min(cint(page_length) or 500, BALANCE_BATCH_SIZE)
+
+	customers = frappe.db.sql_list(
+		"""
+        SELECT DISTINCT customer
+        FROM `tabCustomer Deposit Ledger Entry`
+        WHERE customer > %(after)s
+        ORDER BY customer
+        LIMIT %(page_length)s
+    """,
+		{"after": after or "", "page_length": page_length},
+	)
+
+	if as_of:
+		balances = get_balances_as_of(customers, as_of)
+	else:
+		balances = (
+			dict(
+				frappe.get_all(
+					"Customer",
+					filters={"name": ["in", customers]},
+					fields=["name", "deposit_balance"],
+					as_list=True,
+				)
+			)
+			if customers
+			else {}
+		)
+
+	return {
+		"balances": [
+			{"customer": customer, "balance": flt(balances.get(customer))} for customer in customers
+		],
+		"next_after": customers[-1] if len(customers) == page_length else None,
+	}
+
+
+@frappe.whitelist()
+def get_deposit_history(customer: str, from_date: str, to_date: str | None = None) -> dict:
+	"""
+	The customer's ledger entries between the dates, with the opening balance (end of the
+	day before `from_date`) and the running balance after each entry.
+	"""
+	frappe.has_permission("Customer", "read", customer, throw=True)
+
+	from_date = getdate(from_date)
+	to_date = getdate(to_date or nowdate())
+	opening = get_balances_as_of([customer], add_days(from_date, -1)).get(customer, 0.0)
+
+	entries = frappe.get_all(
+		"Customer Deposit Ledger Entry",
+		filters=[
+			["customer", "=", customer],
+			["posting_date", ">=", from_date],
+			["posting_date", "<=", to_date],
+		],
+		fields=["posting_date", "entry_type", "amount", "voucher_type", "voucher_no"],
+		order_by="posting_date asc, creation asc",
+	)
+
+	balance = opening
+	for entry in entries:
+		balance += flt(entry.amount)
+		entry.balance = balance
+
+	return {"opening_balance": opening, "closing_balance": balance, "entries": entries}
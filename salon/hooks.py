@@ -83,7 +83,7 @@ app_license = "mit"
 # ------------
 
 # before_install = "salon.install.before_install"
-# after_install = "salon.install.after_install"
+after_install = "salon.install.after_install"
 
 # Uninstallation
 # ------------
@@ -143,32 +143,70 @@ doc_events = {
 	# 	"on_cancel": "method",
 	# 	"on_trash": "method"
 	# }
+    "Customer": {
+        "validate": "salon.utilities.phone.set_canonical_mobile"
+    },
     "Payment Entry": {
-        "on_submit": "salon.events.add_customer_deposit"
+        "on_submit": "salon.events.add_customer_deposit",
+        "on_cancel": "salon.events.reverse_customer_deposit",
     },
     "POS Invoice": {
-        "after_insert": "salon.events.get_advances",
+        "before_validate": "salon.events.get_advances",
         "on_submit": "salon.events.deduct_deposit_balance",
+        "on_cancel": "salon.events.reverse_customer_deposit",
     },
     "Sales Invoice": {
-        "on_submit": "salon.events.deduct_deposit_balance"
+        "on_submit": "salon.events.deduct_deposit_balance",
+        "on_cancel": "salon.events.reverse_customer_deposit",
     },
     "Appointment": {
-        "validate": "salon.events.validate_availability"
+        "validate": "salon.events.validate_availability",
+        "after_delete": "salon.utilities.slots.on_appointment_delete",
     },
     "Customer Cart": {
         "on_submit": "salon.events.send_review_messages"
-	}
+	},
+    "Service Review": {
+        "on_update": "salon.ratings.update_rating_aggregates",
+        "on_trash": "salon.ratings.update_rating_aggregates",
+    },
+    "Item": {
+        "on_update": "salon.whatsapp.catalog.on_catalog_change",
+        "on_trash": "salon.whatsapp.catalog.on_catalog_change",
+    },
+    "Item Group": {
+        "on_update": "salon.whatsapp.catalog.on_catalog_change",
+        "on_trash": "salon.whatsapp.catalog.on_catalog_change",
+    },
+    "Item Price": {
+        "on_update": "salon.whatsapp.catalog.on_catalog_change",
+        "on_trash": "salon.whatsapp.catalog.on_catalog_change",
+    },
 }
 
 # Scheduled Tasks
 # ---------------
 
 scheduler_events = {
+    "all": [
+        "salon.whatsapp.inbox.process_webhook_events",
+    ],
+    "hourly": [
+        "salon.whatsapp.reviews.send_review_requests",
+    ],
+    "daily": [
+        "salon.utilities.slots.seed_slots",
+        "salon.whatsapp.templates.sync_templates",
+        "salon.deposits.reconcile_deposit_balances",
+        "salon.deposits.take_deposit_snapshots",
+    ],
     "cron": {
 		"0 */12 * * *": [
 			"salon.utilities.scheduler.send_appointment_reminder",
 		],
+		"*/10 * * * *": [
+			"salon.whatsapp.broadcast.resume_stalled_broadcasts",
+		],
 		# "0/30 * * * *": [
 		# 	"erpnext.utilities.doctype.video.video.update_youtube_data",
 		# ],
@@ -230,11 +268,13 @@ scheduler_events = {
 # ----------------
 # before_request = ["salon.utils.before_request"]
 # after_request = ["salon.utils.after_request"]
+after_request = ["salon.whatsapp.gateway.flush_latency_metrics"]
 
 # Job Events
 # ----------
 # before_job = ["salon.utils.before_job"]
 # after_job = ["salon.utils.after_job"]
+after_job = ["salon.whatsapp.gateway.flush_latency_metrics"]
 
 # User Data Protection
 # --------------------
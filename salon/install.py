@@ -0,0 +1,44 @@
+from frappe.custom.doctype.custom_field.custom_field import create_custom_fields
+
+
+def after_install():
+    create_customer_fields()
+    create_service_review_fields()
+
+
+def create_customer_fields():
+    create_custom_fields(
+        {
+            "Customer": [
+                {
+                    "fieldname": "canonical_mobile",
+                    "fieldtype": "Data",
+                    "label": "Canonical Mobile",
+                    "insert_after": "mobile_no",
+                    "read_only": 1,
+                    "hidden": 1,
+                    "no_copy": 1,
+                    "search_index": 1,
+                },
+            ],
+        },
+        update=True,
+    )
+
+
+def create_service_review_fields():
+    create_custom_fields(
+        {
+            "Service Review": [
+                {
+                    "fieldname": "review_requested_on",
+                    "fieldtype": "Datetime",
+                    "label": "Review Requested On",
+                    "insert_after": "status",
+                    "read_only": 1,
+                    "no_copy": 1,
+                },
+            ],
+        },
+        update=True,
+    )
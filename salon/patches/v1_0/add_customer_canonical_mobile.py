@@ -0,0 +1,14 @@
+import frappe
+
+from salon.install import create_customer_fields
+
+
+def execute():
+    create_customer_fields()
+
+    frappe.enqueue(
+        "salon.utilities.phone.backfill_canonical_mobile",
+        queue="long",
+        timeout=3600,
+        enqueue_after_commit=True,
+    )
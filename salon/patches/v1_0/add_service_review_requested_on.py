@@ -0,0 +1,14 @@
+import frappe
+
+from salon.install import create_service_review_fields
+
+
+def execute():
+    create_service_review_fields()
+
+    ## Reviews created before the pipeline were never prompted; keep them out of it
+    frappe.db.sql("""
+        UPDATE `tabService Review`
+        SET review_requested_on = creation
+        WHERE review_requested_on IS NULL
+    """)
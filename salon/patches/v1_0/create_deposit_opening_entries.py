@@ -0,0 +1,5 @@
+from salon.deposits import create_opening_entries
+
+
+def execute():
+    create_opening_entries()
@@ -0,0 +1,5 @@
+from salon.ratings import rebuild_rating_aggregates
+
+
+def execute():
+    rebuild_rating_aggregates()
@@ -0,0 +1,10 @@
+import frappe
+
+
+def execute():
+    """Broadcasts sent before the status field existed were initialised, and submitted if submitted."""
+    frappe.db.sql("""
+        UPDATE `tabWhatsApp Message Broadcast`
+        SET status = IF(docstatus = 1, 'Submitted', 'Initialised')
+        WHERE IFNULL(reference_id, '') != ''
+    """)
@@ -0,0 +1,222 @@
+import frappe
+from frappe.utils import cint, get_datetime, now_datetime
+
+ALL_PERIODS = "All"
+DIMENSIONS = {"Employee": "employee", "Service": "service"}
+STARS = (1, 2, 3, 4, 5)
+
+
+def get_aggregate_name(dimension: str, reference: str, period: str) -> str:
+	return f"{dimension}-{period}-{reference}"
+
+
+def get_review_contributions(review) -> list:
+	"""
+	The (dimension, reference, period, rating) rows a reviewed Service Review counts towards:
+	its employee and its service, each for the review's month and for all time.
+	"""
+	rating = cint(review.get("rating_number"))
+	if review.get("status") != "Reviewed" or rating not in STARS:
+		return []
+
+	month = get_datetime(review.get("creation") or now_datetime()).strftime("%Y-%m")
+
+	contributions = []
+	for dimension, fieldname in DIMENSIONS.items():
+		reference = review.get(fieldname)
+		if not reference:
+			continue
+
+		for period in (month, ALL_PERIODS):
+			contributions.append((dimension, reference, period, rating))
+
+	return contributions
+
+
+def update_rating_aggregates(doc, method=None):
+	"""
+	Applies the difference between the review as saved and as it was before, so a first
+	rating adds to the aggregates, a changed rating or employee moves it, and a deleted
+	review takes it back out. Unchanged reviews touch nothing.
+	"""
+	before = doc.get_doc_before_save() if method != "on_trash" else doc
+	old = get_review_contributions(before) if before else []
+	new = get_review_contributions(doc) if method != "on_trash" else []
+
+	if old == new:
+		return
+
+	## Waits out a running rebuild, which holds every review row until it commits
+	lock_reviews(doc.name)
+
+	deltas = {}
+	for sign, contributions in ((-1, old), (1, new)):
+		for dimension, reference, period, rating in contributions:
+			delta = deltas.setdefault(
+				(dimension, reference, period), {"count": 0, "sum": 0, "stars": dict.fromkeys(STARS, 0)}
+			)
+			delta["count"] += sign
+			delta["sum"] += sign * rating
+			delta["stars"][rating] += sign
+
+	apply_rating_deltas({key: delta for key, delta in deltas.items() if delta["count"] or delta["sum"]})
+
+
+def apply_rating_deltas(deltas: dict):
+	"""
+	Adds the deltas to their aggregates in one INSERT ... ON DUPLICATE KEY UPDATE, so
+	concurrent reviews of the same employee never overwrite each other's totals.
+	"""
+	if not deltas:
+		return
+
+	now = now_datetime()
+	user = frappe.session.user
+	rows, values = [], {"now": now, "user": user}
+
+	for i, ((dimension, reference, period), delta) in enumerate(deltas.items()):
+		rows.append(
+			f"(%(name{i})s, %(now)s, %(now)s, %(user)s, %(user)s, %(dimension{i})s, %(reference{i})s, %(period{i})s,"
+			f" %(count{i})s, %(sum{i})s, {', '.join(f'%(stars_{star}_{i})s' for star in STARS)},"
+			f" %(sum{i})s / NULLIF(%(count{i})s, 0))"
+		)
+		values.update(
+			{
+				f"name{i}": get_aggregate_name(dimension, reference, period),
+				f"dimension{i}": dimension,
+				f"reference{i}": reference,
+				f"period{i}": period,
+				f"count{i}": delta["count"],
+				f"sum{i}": delta["sum"],
+				**{f"stars_{star}_{i}": delta["stars"][star] for star in STARS},
+			}
+		)
+
+	## Assignments run left to right, so average_rating sees the updated totals
+	frappe.db.sql(
+		f"""
+        INSERT INTO `tabService Rating Aggregate`
+            (name, creation, modified, owner, modified_by, dimension, reference, period,
+            review_count, rating_sum, {", ".join(f"stars_{star}" for star in STARS)}, average_rating)
+        VALUES
+            {", ".join(rows)}
+        ON DUPLICATE KEY UPDATE
+            review_count = review_count + VALUES(review_count),
+            rating_sum = rating_sum + VALUES(rating_sum),
+            {" ".join(f"stars_{star} = stars_{star} + VALUES(stars_{star})," for star in STARS)}
+            average_rating = rating_sum / NULLIF(review_count, 0),
+            modified = VALUES(modified),
+            modified_by = VALUES(modified_by)
+    """,
+		values,
+	)
+
+
+def lock_reviews(name: str | None = None):
+	"""
+	Locks one Service Review row, or every row and the gaps between them. A rebuild
+	therefore waits for in-flight review saves and holds back new ones until it commits.
+	"""
+	frappe.db.sql(
+		f"""
+        SELECT name FROM `tabService Review`
+        {"WHERE name = %(name)s" if name else ""}
+        FOR UPDATE
+    """,
+		{"name": name},
+	)
+
+
+def rebuild_rating_aggregates():
+	"""
+	Recomputes every aggregate from the reviewed Service Reviews, one grouped query per
+	dimension and period, with the reviews locked so no save is counted twice or lost.
+	"""
+	lock_reviews()
+	frappe.db.delete("Service Rating Aggregate")
+
+	stars = ", ".join(f"SUM(rating_number = {star})" for star in STARS)
+	for dimension, fieldname in DIMENSIONS.items():
+		for period in ("DATE_FORMAT(creation, '%%Y-%%m')", f"'{ALL_PERIODS}'"):
+			frappe.db.sql(
+				f"""
+                INSERT INTO `tabService Rating Aggregate`
+                    (name, creation, modified, owner, modified_by, dimension, reference, period,
+                    review_count, rating_sum, {", ".join(f"stars_{star}" for star in STARS)}, average_rating)
+                SELECT
+                    CONCAT(%(dimension)s, '-', {period}, '-', {fieldname}),
+                    %(now)s, %(now)s, 'Administrator', 'Administrator',
+                    %(dimension)s, {fieldname}, {period},
+                    COUNT(*), SUM(rating_number), {stars}, AVG(rating_number)
+                FROM
+                    `tabService Review`
+                WHERE
+                    status = 'Reviewed'
+                    AND rating_number BETWEEN 1 AND 5
+                    AND IFNULL({fieldname}, '') != ''
+                GROUP BY
+                    {fieldname}, {period}
+            """,
+				{"dimension": dimension, "now": now_datetime()},
+			)
+
+	frappe.db.commit()
+
+
+@frappe.whitelist()
+def enqueue_rating_rebuild():
+	frappe.only_for("System Manager")
+
+	frappe.enqueue(
+		"salon.ratings.rebuild_rating_aggregates",
+		queue="long",
+		job_id="salon_rating_rebuild",
+		deduplicate=True,
+	)
+
+
+@frappe.whitelist()
+def get_rating_leaderboard(
+	dimension: str = "Employee", period: str = ALL_PERIODS, limit: int = 10, min_reviews: int = 1
+) -> list:
+	"""
+	Best rated employees or services for a month (YYYY-MM) or for all time, read from the
+	aggregates through the (dimension, period, average_rating) index.
+	"""
+	frappe.has_permission("Service Rating Aggregate", "read", throw=True)
+
+	if dimension not in DIMENSIONS:
+		frappe.throw(f"Dimension must be one of {', '.join(DIMENSIONS)}")
+
+	label = (
+		"(SELECT employee_name FROM `tabEmployee` WHERE name = a.reference)"
+		if dimension == "Employee"
+		else "(SELECT item_name FROM `tabItem` WHERE name = a.reference)"
+	)
+
+	return frappe.db.sql(
+		f"""
+        SELECT
+            a.reference,
+            {label} AS reference_name,
+            a.review_count,
+            a.average_rating,
+            {", ".join(f"a.stars_{star}" for star in STARS)}
+        FROM
+            `tabService Rating Aggregate` AS a
+        WHERE
+            a.dimension = %(dimension)s
+            AND a.period = %(period)s
+            AND a.review_count >= %(min_reviews)s
+        ORDER BY
+            a.average_rating DESC
+        LIMIT %(limit)s
+    """,
+		{
+			"dimension": dimension,
+			"period": period or ALL_PERIODS,
+			"min_reviews": max(cint(min_reviews), 1),
+			"limit": min(cint(limit) or 10, 100),
+		},
+		as_dict=True,
+	)
@@ -1,9 +1,33 @@
 # Copyright (c) 2025, salon and contributors
 # For license information, please see license.txt
 
-# import frappe
+import frappe
 from frappe.model.document import Document
 
+from salon.utilities.availability import clear_shift_settings_cache
+
 
 class AppointmentSetting(Document):
-	pass
+	def on_update(self):
+		clear_shift_settings_cache()
+		self.reseed_slots()
+
+	def on_trash(self):
+		clear_shift_settings_cache()
+		self.reseed_slots()
+
+	def reseed_slots(self):
+		"""Rebuilds the Appointment Slot rows of the employee/department this shift belongs to (and belonged to)."""
+		shifts = {(self.employee, self.department)}
+
+		previous = self.get_doc_before_save()
+		if previous:
+			shifts.add((previous.employee, previous.department))
+
+		for employee, department in shifts:
+			frappe.enqueue(
+				"salon.utilities.slots.seed_slots",
+				employee=employee,
+				department=department,
+				enqueue_after_commit=True,
+			)
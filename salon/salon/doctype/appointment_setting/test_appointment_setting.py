@@ -1,9 +1,40 @@
 # Copyright (c) 2025, salon and Contributors
 # See license.txt
 
-# import frappe
+import frappe
+from datetime import datetime
 from frappe.tests.utils import FrappeTestCase
 
+from salon.utilities.availability import Occupancy, build_slots
+
 
 class TestAppointmentSetting(FrappeTestCase):
-	pass
+	def test_build_slots_uses_occupancy(self):
+		setting = frappe._dict(customers_capacity=2, duration=1800, **{"from": "10:00:00", "to": "11:30:00"})
+		occupancy = Occupancy(
+			[
+				(datetime(2025, 12, 20, 10, 30), datetime(2025, 12, 20, 11, 0)),
+				(datetime(2025, 12, 20, 10, 30), datetime(2025, 12, 20, 11, 0)),
+				(datetime(2025, 12, 20, 11, 0), datetime(2025, 12, 20, 11, 30)),
+			]
+		)
+
+		slots = build_slots("2025-12-20", setting, occupancy)
+
+		self.assertEqual(slots["duration"], 1800)
+		self.assertEqual(
+			slots["times"],
+			[
+				{"value": "10:00:00", "available": True},
+				{"value": "10:30:00", "available": False},
+				{"value": "11:00:00", "available": True},
+			],
+		)
+
+	def test_off_grid_appointment_blocks_overlapping_slots(self):
+		# A 10:15-10:45 booking overlaps both the 10:00 and the 10:30 slot
+		occupancy = Occupancy([(datetime(2025, 12, 20, 10, 15), datetime(2025, 12, 20, 10, 45))])
+
+		self.assertEqual(occupancy.peak(datetime(2025, 12, 20, 10, 0), datetime(2025, 12, 20, 10, 30)), 1)
+		self.assertEqual(occupancy.peak(datetime(2025, 12, 20, 10, 30), datetime(2025, 12, 20, 11, 0)), 1)
+		self.assertEqual(occupancy.peak(datetime(2025, 12, 20, 10, 45), datetime(2025, 12, 20, 11, 15)), 0)
@@ -0,0 +1,8 @@
+// Copyright (c) 2026, salon and contributors
+// For license information, please see license.txt
+
+// frappe.ui.form.on("Appointment Slot", {
+// 	refresh(frm) {
+
+// 	},
+// });
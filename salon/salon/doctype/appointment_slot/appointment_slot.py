@@ -0,0 +1,14 @@
+# Copyright (c) 2026, salon and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class AppointmentSlot(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_unique("Appointment Slot", ["employee", "department", "slot_start"])
+	frappe.db.add_index("Appointment Slot", ["employee", "slot_start"])
@@ -0,0 +1,160 @@
+# Copyright (c) 2026, salon and Contributors
+# See license.txt
+
+import threading
+import time
+from datetime import datetime, timedelta
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_days, getdate, nowdate
+
+from salon.events import validate_availability
+from salon.utilities.availability import SHIFT_SETTINGS_CACHE_KEY
+from salon.utilities.slots import seed_slots
+
+EMPLOYEE = "_T-SLOT-EMP"
+DEPARTMENT = "_T-SLOT-DEPT"
+
+
+def make_appointment(name, start, minutes=30, status="Open"):
+	## Raw inserts: the test only needs the columns seed_slots reads
+	frappe.get_doc(
+		{
+			"doctype": "Appointment",
+			"name": name,
+			"employee": EMPLOYEE,
+			"department": DEPARTMENT,
+			"scheduled_time": start,
+			"scheduled_end_time": start + timedelta(minutes=minutes),
+			"status": status,
+		}
+	).db_insert()
+
+
+class TestAppointmentSlot(FrappeTestCase):
+	def setUp(self):
+		self.day = getdate(add_days(nowdate(), 7))
+		self.at = lambda hour, minute: datetime(self.day.year, self.day.month, self.day.day, hour, minute)
+
+		frappe.db.delete("Appointment Slot", {"employee": EMPLOYEE})
+		frappe.db.delete("Appointment Setting", {"employee": EMPLOYEE})
+		frappe.db.delete("Appointment", {"employee": EMPLOYEE})
+
+		frappe.get_doc(
+			{
+				"doctype": "Appointment Setting",
+				"name": "_T-SLOT-SETTING",
+				"employee": EMPLOYEE,
+				"department": DEPARTMENT,
+				"weekday": str(self.day.weekday()),
+				"from": "10:00:00",
+				"to": "11:30:00",
+				"duration": 1800,
+				"customers_capacity": 2,
+			}
+		).db_insert()
+
+	def get_slots(self):
+		return frappe.get_all(
+			"Appointment Slot",
+			filters={"employee": EMPLOYEE},
+			fields=["slot_start", "capacity", "booked"],
+			order_by="slot_start asc",
+		)
+
+	def test_seed_counts_open_appointments(self):
+		make_appointment("_T-SLOT-APT-1", self.at(10, 30))
+		make_appointment("_T-SLOT-APT-2", self.at(10, 30))
+		make_appointment("_T-SLOT-APT-3", self.at(10, 0), status="Cancelled")
+
+		self.assertEqual(seed_slots(EMPLOYEE, DEPARTMENT, self.day, days=1), 3)
+
+		slots = self.get_slots()
+		self.assertEqual(
+			[slot.slot_start for slot in slots], [self.at(10, 0), self.at(10, 30), self.at(11, 0)]
+		)
+		self.assertEqual([slot.capacity for slot in slots], [2, 2, 2])
+		self.assertEqual([slot.booked for slot in slots], [0, 2, 0])
+
+	def test_reseed_keeps_existing_bookings(self):
+		make_appointment("_T-SLOT-APT-1", self.at(10, 30))
+		seed_slots(EMPLOYEE, DEPARTMENT, self.day, days=1)
+
+		make_appointment("_T-SLOT-APT-2", self.at(11, 0))
+		seed_slots(EMPLOYEE, DEPARTMENT, self.day, days=1)
+
+		slots = self.get_slots()
+		self.assertEqual(len(slots), 3)
+		self.assertEqual([slot.booked for slot in slots], [0, 1, 1])
+
+	def test_concurrent_bookings_never_exceed_capacity(self):
+		## Each booking runs on its own connection, so the setup has to be committed
+		frappe.db.set_value("Appointment Setting", "_T-SLOT-SETTING", "customers_capacity", 1)
+		if not frappe.db.exists("Employee", EMPLOYEE):
+			frappe.get_doc(
+				{"doctype": "Employee", "name": EMPLOYEE, "first_name": EMPLOYEE, "status": "Active"}
+			).db_insert()
+		frappe.db.commit()
+		frappe.cache.delete_value(SHIFT_SETTINGS_CACHE_KEY)
+		self.addCleanup(self.remove_committed_records)
+
+		site, sites_path = frappe.local.site, frappe.local.sites_path
+		first_reserved = threading.Event()
+		results = {}
+
+		def book(name, before_commit=None):
+			frappe.init(site=site, sites_path=sites_path)
+			frappe.connect()
+			try:
+				doc = frappe.get_doc(
+					{
+						"doctype": "Appointment",
+						"name": name,
+						"employee": EMPLOYEE,
+						"department": DEPARTMENT,
+						"selected_date": self.day,
+						"scheduled_time": self.at(10, 30),
+						"scheduled_end_time": self.at(11, 0),
+						"status": "Open",
+					}
+				)
+				validate_availability(doc)
+				doc.db_insert()
+				if before_commit:
+					before_commit()
+				frappe.db.commit()
+				results[name] = "booked"
+			except frappe.ValidationError:
+				results[name] = "full"
+			finally:
+				first_reserved.set()
+				frappe.db.rollback()
+				frappe.destroy()
+
+		def hold_first_booking():
+			## The second booking starts while the first is still uncommitted
+			first_reserved.set()
+			time.sleep(1)
+
+		def book_second():
+			first_reserved.wait()
+			book("_T-SLOT-APT-2")
+
+		first = threading.Thread(target=book, args=("_T-SLOT-APT-1", hold_first_booking))
+		second = threading.Thread(target=book_second)
+		first.start()
+		second.start()
+		first.join()
+		second.join()
+
+		self.assertEqual(results, {"_T-SLOT-APT-1": "booked", "_T-SLOT-APT-2": "full"})
+		self.assertEqual(frappe.db.count("Appointment", {"employee": EMPLOYEE, "status": "Open"}), 1)
+
+	def remove_committed_records(self):
+		frappe.db.delete("Appointment Slot", {"employee": EMPLOYEE})
+		frappe.db.delete("Appointment Setting", {"employee": EMPLOYEE})
+		frappe.db.delete("Appointment", {"employee": EMPLOYEE})
+		frappe.db.delete("Employee", {"name": EMPLOYEE})
+		frappe.db.commit()
+		frappe.cache.delete_value(SHIFT_SETTINGS_CACHE_KEY)
@@ -0,0 +1,14 @@
+# Copyright (c) 2026, salon and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class CustomerDepositLedgerEntry(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_unique("Customer Deposit Ledger Entry", ["voucher_type", "voucher_no", "entry_type"])
+	frappe.db.add_index("Customer Deposit Ledger Entry", ["customer", "posting_date"])
@@ -0,0 +1,43 @@
+# Copyright (c) 2026, salon and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from salon.deposits import get_ledger_mismatches, post_deposit_entry, reverse_deposit_entries
+
+
+def make_customer(name="_Test Deposit Customer"):
+	if not frappe.db.exists("Customer", name):
+		frappe.get_doc({"doctype": "Customer", "customer_name": name, "customer_type": "Individual"}).insert()
+
+	frappe.db.set_value("Customer", name, "deposit_balance", 0)
+	frappe.db.delete("Customer Deposit Ledger Entry", {"customer": name})
+	return name
+
+
+class TestCustomerDepositLedgerEntry(FrappeTestCase):
+	def test_usage_is_guarded_by_balance(self):
+		customer = make_customer()
+
+		self.assertEqual(post_deposit_entry(customer, 100, "Deposit", "Payment Entry", "_T-PE-1"), 100)
+		self.assertEqual(post_deposit_entry(customer, -60, "Usage", "POS Invoice", "_T-POS-1"), 40)
+		self.assertRaises(frappe.ValidationError, post_deposit_entry, customer, -50, "Usage", "POS Invoice", "_T-POS-2")
+
+		self.assertEqual(frappe.db.get_value("Customer", customer, "deposit_balance"), 40)
+
+	def test_vouchers_post_once_and_reverse(self):
+		customer = make_customer()
+
+		post_deposit_entry(customer, 100, "Deposit", "Payment Entry", "_T-PE-2")
+		self.assertIsNone(post_deposit_entry(customer, 100, "Deposit", "Payment Entry", "_T-PE-2"))
+
+		reverse_deposit_entries("Payment Entry", "_T-PE-2")
+		self.assertEqual(frappe.db.get_value("Customer", customer, "deposit_balance"), 0)
+		self.assertFalse([m for m in get_ledger_mismatches(limit=10000) if m.name == customer])
+
+	def test_unknown_customer_is_not_reported_as_insufficient(self):
+		self.assertRaises(
+			frappe.DoesNotExistError,
+			post_deposit_entry, "_Test Missing Deposit Customer", 10, "Deposit", "Payment Entry", "_T-PE-3",
+		)
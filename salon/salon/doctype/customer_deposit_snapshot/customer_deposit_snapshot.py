@@ -0,0 +1,13 @@
+# Copyright (c) 2026, salon and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class CustomerDepositSnapshot(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_unique("Customer Deposit Snapshot", ["customer", "snapshot_date"])
@@ -0,0 +1,46 @@
+# Copyright (c) 2026, salon and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_days, nowdate
+
+from salon.deposits import get_balances_as_of, get_deposit_history, post_deposit_entry, take_deposit_snapshots
+from salon.salon.doctype.customer_deposit_ledger_entry.test_customer_deposit_ledger_entry import make_customer
+
+
+class TestCustomerDepositSnapshot(FrappeTestCase):
+	def test_point_in_time_balance_uses_snapshot_and_deltas(self):
+		customer = make_customer("_Test Snapshot Customer")
+		frappe.db.delete("Customer Deposit Snapshot", {"customer": customer})
+
+		post_deposit_entry(customer, 200, "Deposit", "Payment Entry", "_T-SNAP-PE-1", add_days(nowdate(), -10))
+		take_deposit_snapshots(add_days(nowdate(), -5))
+		post_deposit_entry(customer, -50, "Usage", "POS Invoice", "_T-SNAP-POS-1", add_days(nowdate(), -2))
+
+		self.assertEqual(frappe.db.get_value("Customer Deposit Snapshot", {"customer": customer}, "balance"), 200)
+		self.assertEqual(get_balances_as_of([customer], add_days(nowdate(), -11))[customer], 0)
+		self.assertEqual(get_balances_as_of([customer], add_days(nowdate(), -3))[customer], 200)
+		self.assertEqual(get_balances_as_of([customer], nowdate())[customer], 150)
+
+		history = get_deposit_history(customer, add_days(nowdate(), -4))
+		self.assertEqual(history["opening_balance"], 200)
+		self.assertEqual(history["closing_balance"], 150)
+		self.assertEqual([entry.balance for entry in history["entries"]], [150])
+
+	def test_backdated_entry_invalidates_later_snapshots(self):
+		customer = make_customer("_Test Backdated Snapshot Customer")
+		frappe.db.delete("Customer Deposit Snapshot", {"customer": customer})
+
+		post_deposit_entry(customer, 200, "Deposit", "Payment Entry", "_T-SNAP-PE-2", add_days(nowdate(), -10))
+		take_deposit_snapshots(add_days(nowdate(), -5))
+
+		## Posted today but dated before the snapshot
+		post_deposit_entry(customer, 30, "Deposit", "Payment Entry", "_T-SNAP-PE-3", add_days(nowdate(), -7))
+
+		self.assertFalse(frappe.db.exists("Customer Deposit Snapshot", {"customer": customer}))
+		self.assertEqual(get_balances_as_of([customer], add_days(nowdate(), -8))[customer], 200)
+		self.assertEqual(get_balances_as_of([customer], add_days(nowdate(), -3))[customer], 230)
+
+		take_deposit_snapshots(add_days(nowdate(), -1))
+		self.assertEqual(frappe.db.get_value("Customer Deposit Snapshot", {"customer": customer}, "balance"), 230)
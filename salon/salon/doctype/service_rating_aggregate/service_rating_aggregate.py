@@ -0,0 +1,19 @@
+# Copyright (c) 2026, salon and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from salon.ratings import get_aggregate_name
+
+
+class ServiceRatingAggregate(Document):
+	"""
+	Running rating totals of one employee or service for one month, or for all time.
+	Maintained by salon.ratings from Service Review saves; never edited by hand.
+	"""
+	def autoname(self):
+		self.name = get_aggregate_name(self.dimension, self.reference, self.period)
+
+
+def on_doctype_update():
+	frappe.db.add_index("Service Rating Aggregate", ["dimension", "period", "average_rating"])
@@ -0,0 +1,41 @@
+# Copyright (c) 2026, salon and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from salon.ratings import ALL_PERIODS, apply_rating_deltas, get_rating_leaderboard, get_review_contributions
+
+
+class TestServiceRatingAggregate(FrappeTestCase):
+	def test_contributions_cover_month_and_all_time(self):
+		review = frappe._dict(
+			status="Reviewed", rating_number=4, employee="_T-EMP", service="_T-SRV", creation="2026-03-05 10:00:00"
+		)
+
+		self.assertEqual(get_review_contributions(review), [
+			("Employee", "_T-EMP", "2026-03", 4),
+			("Employee", "_T-EMP", ALL_PERIODS, 4),
+			("Service", "_T-SRV", "2026-03", 4),
+			("Service", "_T-SRV", ALL_PERIODS, 4),
+		])
+		self.assertEqual(get_review_contributions(frappe._dict(review, status="Pending")), [])
+
+	def test_deltas_accumulate_into_leaderboard(self):
+		frappe.db.delete("Service Rating Aggregate", {"period": "1999-01"})
+
+		def delta(count, total, star):
+			return {"count": count, "sum": total, "stars": {s: count if s == star else 0 for s in (1, 2, 3, 4, 5)}}
+
+		apply_rating_deltas({("Employee", "_T-EMP-A", "1999-01"): delta(1, 5, 5)})
+		apply_rating_deltas({("Employee", "_T-EMP-A", "1999-01"): delta(1, 3, 3)})
+		apply_rating_deltas({("Employee", "_T-EMP-B", "1999-01"): delta(1, 2, 2)})
+
+		## A rating changed from 3 to 4
+		apply_rating_deltas({("Employee", "_T-EMP-A", "1999-01"): {"count": 0, "sum": 1, "stars": {1: 0, 2: 0, 3: -1, 4: 1, 5: 0}}})
+
+		leaderboard = get_rating_leaderboard("Employee", "1999-01")
+		self.assertEqual([row.reference for row in leaderboard], ["_T-EMP-A", "_T-EMP-B"])
+		self.assertEqual(leaderboard[0].review_count, 2)
+		self.assertEqual(leaderboard[0].average_rating, 4.5)
+		self.assertEqual((leaderboard[0].stars_3, leaderboard[0].stars_4, leaderboard[0].stars_5), (0, 1, 1))
@@ -0,0 +1,339 @@
+import frappe
+import redis
+from bisect import bisect_left, bisect_right
+from frappe.utils import cint
+from datetime import datetime, timedelta, time
+
+SHIFT_SETTINGS_CACHE_KEY = "salon:appointment_shift_settings"
+SHIFT_SETTINGS_STATS_KEY = "salon:appointment_shift_settings_stats"
+
+
+def parse_time_field(time_value):
+    """Converts a time string or timedelta object into a time object."""
+    if isinstance(time_value, str):
+        # Assume string format is 'HH:MM:SS'
+        return datetime.strptime(time_value, "%H:%M:%S").time()
+    elif isinstance(time_value, (timedelta, time)):
+        # If it's a timedelta, convert it to seconds, then to HH:MM:SS for replacement
+        # If it's a time object, return it directly
+        if isinstance(time_value, timedelta):
+            total_seconds = int(time_value.total_seconds())
+            hours = total_seconds // 3600
+            minutes = (total_seconds % 3600) // 60
+            seconds = total_seconds % 60
+            return time(hours, minutes, seconds)
+        return time_value
+    else:
+        raise TypeError(f"Unsupported time type: {type(time_value)}")
+
+
+def parse_date(date):
+    """Accepts a 'YYYY-MM-DD' string, date or datetime and returns a datetime at midnight."""
+    if isinstance(date, str):
+        return datetime.strptime(date, "%Y-%m-%d")
+    if isinstance(date, datetime):
+        return date.replace(hour=0, minute=0, second=0, microsecond=0)
+    return datetime(date.year, date.month, date.day)
+
+
+def get_shift_setting(employee: str, department: str, weekday: int):
+    """
+    Returns the Appointment Setting row for the employee's shift on the weekday, or None.
+
+    Settings rarely change, so rows (and misses) are kept in a Redis hash that
+    Appointment Setting clears on update and delete.
+    """
+    key = f"{employee}::{department}::{cint(weekday)}"
+
+    setting = frappe.cache.hget(SHIFT_SETTINGS_CACHE_KEY, key)
+    if setting is not None:
+        record_shift_settings_cache("hits")
+        return setting or None
+
+    record_shift_settings_cache("misses")
+    settings = frappe.get_all(
+        "Appointment Setting",
+        filters={
+            "employee": employee,
+            "department": department,
+            "weekday": str(cint(weekday)),
+        },
+        fields=["name", "customers_capacity", "duration", "from", "to"]
+    )
+
+    # An empty dict caches "no shift on this day" as well
+    setting = settings[0] if settings else frappe._dict()
+    frappe.cache.hset(SHIFT_SETTINGS_CACHE_KEY, key, setting)
+
+    return setting or None
+
+
+def record_shift_settings_cache(counter: str):
+    try:
+        # Raw command: the counters are plain integers, not pickled cache values
+        frappe.cache.execute_command("HINCRBY", frappe.cache.make_key(SHIFT_SETTINGS_STATS_KEY), counter, 1)
+    except redis.exceptions.ConnectionError:
+        pass
+
+
+def clear_shift_settings_cache():
+    frappe.cache.delete_value(SHIFT_SETTINGS_CACHE_KEY)
+
+
+@frappe.whitelist()
+def get_shift_settings_cache_stats():
+    """Hit/miss counters of the shift settings cache, for monitoring."""
+    frappe.only_for("System Manager")
+
+    hits, misses = frappe.cache.execute_command(
+        "HMGET", frappe.cache.make_key(SHIFT_SETTINGS_STATS_KEY), "hits", "misses"
+    )
+    hits, misses = cint(hits), cint(misses)
+
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0,
+        "cached_shifts": frappe.cache.execute_command("HLEN", frappe.cache.make_key(SHIFT_SETTINGS_CACHE_KEY)),
+    }
+
+
+class Occupancy:
+    """
+    Step function of concurrent bookings built from appointment intervals.
+
+    Intervals are half-open [start, end), so back-to-back appointments do not overlap.
+    `peak(start, end)` returns the highest number of appointments running at the same
+    moment inside the window: two binary searches plus a sparse-table range maximum,
+    i.e. O(log n) per check after an O(n log n) build.
+    """
+
+    def __init__(self, intervals):
+        deltas = {}
+        for start, end in intervals:
+            if end <= start:
+                continue
+            deltas[start] = deltas.get(start, 0) + 1
+            deltas[end] = deltas.get(end, 0) - 1
+
+        self.points = sorted(deltas)
+
+        # levels[i] is the number of running appointments in [points[i], points[i + 1])
+        levels = []
+        active = 0
+        for point in self.points:
+            active += deltas[point]
+            levels.append(active)
+
+        self._table = [levels]
+        width = 1
+        while width * 2 <= len(levels):
+            previous = self._table[-1]
+            self._table.append([
+                max(previous[i], previous[i + width])
+                for i in range(len(levels) - width * 2 + 1)
+            ])
+            width *= 2
+
+    @classmethod
+    def from_rows(cls, rows, default_duration: int):
+        """Builds the occupancy from (start, end) rows, using `default_duration` seconds when end is missing."""
+        step = timedelta(seconds=default_duration)
+        return cls((start, end or start + step) for start, end in rows)
+
+    def peak(self, start: datetime, end: datetime) -> int:
+        if not self.points or end <= start:
+            return 0
+
+        # Last breakpoint at or before `start` and last breakpoint strictly before `end`
+        lo = max(bisect_right(self.points, start) - 1, 0)
+        hi = bisect_left(self.points, end) - 1
+        if hi < lo:
+            return 0
+
+        level = (hi - lo + 1).bit_length() - 1
+        row = self._table[level]
+        return max(row[lo], row[hi - (1 << level) + 1])
+
+
+def get_occupancy(employee: str, date, default_duration: int, exclude: str | None = None) -> Occupancy:
+    """Loads all Open appointments of the employee on the date in one query."""
+    rows = load_appointment_intervals([employee], date, date, exclude).get(employee, [])
+    return Occupancy.from_rows(rows, default_duration)
+
+
+def load_appointment_intervals(
+    employees: list, from_date, to_date, exclude: str | None = None, for_update: bool = False
+) -> dict:
+    """
+    Loads the Open appointments of several employees overlapping a date range in one query.
+    `for_update` makes it a locking read, which sees rows committed after the transaction began.
+
+    :return: {employee: [(scheduled_time, scheduled_end_time), ...]}
+    """
+    if not employees:
+        return {}
+
+    range_start = parse_date(from_date)
+    range_end = parse_date(to_date) + timedelta(days=1)
+
+    rows = frappe.db.sql("""
+        SELECT
+            t1.employee,
+            t1.scheduled_time,
+            t1.scheduled_end_time
+        FROM
+            `tabAppointment` AS t1
+        WHERE
+            t1.employee IN %(employees)s
+            AND t1.status = 'Open'
+            AND t1.name != %(exclude)s
+            AND t1.scheduled_time < %(range_end)s
+            AND IFNULL(t1.scheduled_end_time, t1.scheduled_time) >= %(range_start)s
+        {lock}
+    """.format(lock="FOR UPDATE" if for_update else ""), {
+        "employees": tuple(employees),
+        "exclude": exclude or "",
+        "range_start": range_start,
+        "range_end": range_end,
+    }, as_dict=True)
+
+    intervals = {}
+    for row in rows:
+        intervals.setdefault(row.employee, []).append((row.scheduled_time, row.scheduled_end_time))
+
+    return intervals
+
+
+def iter_slot_windows(date, setting):
+    """Yields the (start, end) datetimes of every slot in the shift of `setting` on `date`."""
+    date_obj = parse_date(date)
+
+    ## Parse shift start and end times
+    start_time_obj = parse_time_field(setting["from"])
+    end_time_obj = parse_time_field(setting["to"])
+
+    start_datetime = datetime.combine(date_obj.date(), start_time_obj)
+    end_datetime = datetime.combine(date_obj.date(), end_time_obj)
+
+    step = timedelta(seconds=int(setting.get("duration") or 1800))
+    current_time = start_datetime
+
+    # Loop through the time range, stepping by the appointment duration
+    while current_time + step <= end_datetime:
+        yield current_time, current_time + step
+        current_time += step
+
+
+def build_slots(date, setting, occupancy: Occupancy) -> dict:
+    """
+    Steps through the shift of `setting` on `date` and answers every slot from the
+    in-memory `occupancy` without touching the database.
+    """
+    duration_seconds = int(setting.get("duration") or 1800)
+    customers_capacity = int(setting.get("customers_capacity") or 0)
+
+    available_times = []
+    for slot_start, slot_end in iter_slot_windows(date, setting):
+        remaining_capacity = customers_capacity - occupancy.peak(slot_start, slot_end)
+
+        available_times.append({
+            "value": slot_start.strftime("%H:%M:%S"),
+            "available": remaining_capacity > 0
+        })
+
+    return {"times": available_times, "duration": duration_seconds}
+
+
+def get_employee_slots(employee: str, department: str, date, exclude: str | None = None) -> dict:
+    """
+    Lists the employee's slots on the date with their availability.
+    Costs one settings lookup and one appointments query regardless of shift length.
+    """
+    date_obj = parse_date(date)
+
+    setting = get_shift_setting(employee, department, date_obj.weekday())
+    if not setting:
+        return {"times": []}
+
+    try:
+        occupancy = get_occupancy(employee, date_obj, int(setting.duration or 1800), exclude)
+        return build_slots(date_obj, setting, occupancy)
+    except ValueError:
+        return {"error": "Invalid time format in Appointment Setting."}
+
+
+def get_department_availability(department: str, employees: list, from_date, to_date) -> list:
+    """
+    Lists the available slots of all `employees` in the department for every day in the range.
+    Settings, approved leaves and appointments are bulk loaded, so the cost is a fixed
+    number of queries regardless of how many employees or days are searched.
+    """
+    range_start = parse_date(from_date)
+    range_end = parse_date(to_date)
+
+    if not employees or range_end < range_start:
+        return []
+
+    settings = {}
+    for setting in frappe.get_all(
+        "Appointment Setting",
+        filters={
+            "employee": ["in", employees],
+            "department": department,
+        },
+        fields=["name", "employee", "weekday", "customers_capacity", "duration", "from", "to"]
+    ):
+        settings.setdefault((setting.employee, cint(setting.weekday)), setting)
+
+    leaves = {}
+    for leave in frappe.get_all(
+        "Leave Application",
+        filters={
+            "employee": ["in", employees],
+            "status": "Approved",
+            "from_date": ["<=", range_end.date()],
+            "to_date": [">=", range_start.date()],
+        },
+        fields=["employee", "from_date", "to_date"]
+    ):
+        leaves.setdefault(leave.employee, []).append(leave)
+
+    intervals = load_appointment_intervals(employees, range_start, range_end)
+    occupancies = {}
+
+    availability = []
+    day = range_start
+    while day <= range_end:
+        for employee in employees:
+            setting = settings.get((employee, day.weekday()))
+            if not setting:
+                continue
+
+            on_leave = any(
+                leave.from_date <= day.date() <= leave.to_date
+                for leave in leaves.get(employee, [])
+            )
+            if on_leave:
+                continue
+
+            duration = int(setting.duration or 1800)
+            if (employee, duration) not in occupancies:
+                occupancies[(employee, duration)] = Occupancy.from_rows(intervals.get(employee, []), duration)
+
+            try:
+                times = build_slots(day, setting, occupancies[(employee, duration)])["times"]
+            except ValueError:
+                continue
+
+            available_times = [slot["value"] for slot in times if slot["available"]]
+            if available_times:
+                availability.append({
+                    "date": day.strftime("%Y-%m-%d"),
+                    "employee": employee,
+                    "available_times": available_times,
+                })
+
+        day += timedelta(days=1)
+
+    return availability
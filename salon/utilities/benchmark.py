@@ -0,0 +1,366 @@
+"""
+Benchmarks and stress tests, meant to be run against a site with real data:
+
+    bench --site <site> execute salon.utilities.benchmark.available_times \
+        --kwargs "{'employee': 'HR-EMP-00001', 'department': 'Hair', 'date': '2025-12-20'}"
+
+`available_times` is read-only. `booking_stress` creates appointments and deletes
+them again when it finishes, so run it on a staging site. `reminder_dispatch` only
+talks to a local fake gateway. `pos_invoice_insert` rolls back every invoice it inserts.
+"""
+import frappe
+import requests
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from time import perf_counter
+from salon.utilities.availability import Occupancy, build_slots, get_occupancy, get_shift_setting, parse_date
+from salon.whatsapp.dispatcher import ReminderDispatcher, batch_reminder_messages
+from salon.whatsapp.fake_gateway import FakeGateway
+from salon.whatsapp.gateway import SUBMIT_BROADCAST_PATH, GatewayClient, get_session
+
+
+@contextmanager
+def count_queries():
+    """Counts the SQL statements issued through frappe.db.sql inside the block."""
+    counter = {"queries": 0}
+    original_sql = frappe.db.sql
+
+    def counting_sql(*args, **kwargs):
+        counter["queries"] += 1
+        return original_sql(*args, **kwargs)
+
+    frappe.db.sql = counting_sql
+    try:
+        yield counter
+    finally:
+        frappe.db.sql = original_sql
+
+
+def measure(fn, runs: int):
+    """Runs fn `runs` times and returns (queries per run, average latency in ms)."""
+    with count_queries() as counter:
+        started = perf_counter()
+        for _ in range(runs):
+            fn()
+        elapsed = perf_counter() - started
+
+    return counter["queries"] // runs, round(elapsed * 1000 / runs, 3)
+
+
+def legacy_slots(employee: str, date_obj: datetime, setting, exclude: str):
+    """The previous implementation: one COUNT query per slot in the shift."""
+    times = build_slots(date_obj, setting, Occupancy([]))["times"]
+    for slot in times:
+        check_datetime = datetime.combine(
+            date_obj.date(), datetime.strptime(slot["value"], "%H:%M:%S").time()
+        )
+        booked_count = frappe.db.count(
+            "Appointment",
+            filters={
+                "name": ["!=", exclude],
+                "employee": employee,
+                "scheduled_time": check_datetime.strftime("%Y-%m-%d %H:%M:%S"),
+                "status": "Open",
+            }
+        )
+        slot["available"] = int(setting.customers_capacity) - booked_count > 0
+
+    return times
+
+
+def available_times(
+    employee: str,
+    department: str,
+    date: str,
+    shift_hours: str = "2,4,6,8,10,12",
+    duration: int = 900,
+    runs: int = 5,
+):
+    """
+    Compares the per-slot COUNT implementation with the interval occupancy engine
+    for growing shift lengths, using the employee's real appointments on `date`.
+    """
+    date_obj = parse_date(date)
+    base_setting = get_shift_setting(employee, department, date_obj.weekday()) or frappe._dict(
+        customers_capacity=1, **{"from": "09:00:00"}
+    )
+    shift_start = datetime.strptime(str(base_setting["from"]), "%H:%M:%S")
+
+    results = []
+    for hours in [int(h) for h in str(shift_hours).split(",")]:
+        shift_end = shift_start + timedelta(hours=hours)
+        if shift_end.date() != shift_start.date():
+            shift_end = shift_start.replace(hour=23, minute=59, second=59)
+
+        setting = frappe._dict(
+            customers_capacity=base_setting.customers_capacity,
+            duration=duration,
+            **{"from": shift_start.strftime("%H:%M:%S"), "to": shift_end.strftime("%H:%M:%S")},
+        )
+
+        legacy_queries, legacy_ms = measure(
+            lambda setting=setting: legacy_slots(employee, date_obj, setting, "None"), runs
+        )
+        engine_queries, engine_ms = measure(
+            lambda setting=setting: build_slots(
+                date_obj, setting, get_occupancy(employee, date_obj, duration, "None")
+            ),
+            runs,
+        )
+
+        results.append({
+            "shift_hours": hours,
+            "slots": len(build_slots(date_obj, setting, Occupancy([]))["times"]),
+            "legacy_queries": legacy_queries,
+            "legacy_ms": legacy_ms,
+            "engine_queries": engine_queries,
+            "engine_ms": engine_ms,
+        })
+
+    return results
+
+
+def booking_stress(
+    employee: str,
+    department: str,
+    date: str,
+    time: str,
+    customer: str,
+    attempts: int = 200,
+    workers: int = 50,
+):
+    """
+    Fires `attempts` simultaneous bookings for the same slot, each from its own
+    database connection, and checks that no more than the slot capacity succeed.
+    """
+    site = frappe.local.site
+    date_obj = parse_date(date)
+    setting = get_shift_setting(employee, department, date_obj.weekday())
+    if not setting:
+        frappe.throw(f"No appointment settings found for {employee} on {date}")
+
+    customer_name = frappe.db.get_value("Customer", customer, "customer_name")
+    scheduled_time = f"{date} {time}"
+    scheduled_end_time = datetime.strptime(scheduled_time, "%Y-%m-%d %H:%M:%S") + timedelta(
+        seconds=int(setting.duration or 1800)
+    )
+
+    already_booked = frappe.db.count(
+        "Appointment",
+        filters={"employee": employee, "scheduled_time": scheduled_time, "status": "Open"},
+    )
+    start_line = threading.Barrier(min(int(workers), int(attempts)))
+
+    def book(_):
+        frappe.init(site=site)
+        frappe.connect()
+        try:
+            try:
+                start_line.wait(timeout=30)
+            except threading.BrokenBarrierError:
+                pass
+
+            appointment = frappe.new_doc("Appointment")
+            appointment.department = department
+            appointment.employee = employee
+            appointment.selected_date = date
+            appointment.scheduled_time = scheduled_time
+            appointment.scheduled_end_time = scheduled_end_time
+            appointment.customer = customer
+            appointment.customer_name = customer_name
+            appointment.appointment_with = "Customer"
+            appointment.party = customer
+            appointment.insert(ignore_permissions=True)
+            frappe.db.commit()
+            return appointment.name
+
+        except frappe.ValidationError:
+            frappe.db.rollback()
+            return None
+
+        finally:
+            frappe.destroy()
+
+    started = perf_counter()
+    with ThreadPoolExecutor(max_workers=int(workers)) as executor:
+        created = [name for name in executor.map(book, range(int(attempts))) if name]
+    elapsed = perf_counter() - started
+
+    for name in created:
+        frappe.delete_doc("Appointment", name, ignore_permissions=True, force=True)
+    frappe.db.commit()
+
+    capacity = int(setting.customers_capacity)
+    return {
+        "attempts": int(attempts),
+        "capacity": capacity,
+        "already_booked": already_booked,
+        "succeeded": len(created),
+        "overbooked": already_booked + len(created) > capacity,
+        "elapsed_ms": round(elapsed * 1000, 3),
+    }
+
+
+def reminder_dispatch(
+    messages: int = 1000,
+    latency: float = 0.05,
+    workers: str = "1,4,8,16,32",
+    rate: float = 1000,
+    failure_rate: float = 0.0,
+):
+    """
+    Sends `messages` reminders to a local fake gateway answering after `latency`
+    seconds, for each pool size in `workers` (1 is the old serial behaviour).
+    """
+    results = []
+    for max_workers in [int(w) for w in str(workers).split(",")]:
+        with FakeGateway(latency=float(latency), failure_rate=float(failure_rate)) as gateway:
+            dispatcher = ReminderDispatcher(
+                GatewayClient(gateway.url, "benchmark"), max_workers=max_workers, rate_per_instance=rate, backoff=0.01
+            )
+            batch = [
+                {"key": i, "instance_id": "benchmark", "payload": {"numbers": [f"9665{i:08d}"]}}
+                for i in range(int(messages))
+            ]
+
+            started = perf_counter()
+            outcomes = dispatcher.dispatch(batch)
+            elapsed = perf_counter() - started
+
+        results.append({
+            "workers": max_workers,
+            "sent": sum(1 for outcome in outcomes if outcome["success"]),
+            "failed": sum(1 for outcome in outcomes if not outcome["success"]),
+            "elapsed_s": round(elapsed, 3),
+            "messages_per_s": round(len(batch) / elapsed, 1),
+        })
+
+    return results
+
+
+def reminder_batching(reminders: int = 1000, batch_sizes: str = "1,25,100", latency: float = 0.05, workers: int = 8):
+    """
+    Sends `reminders` distinct-parameter reminders of one template through a local fake
+    gateway as multi-recipient broadcasts of each size in `batch_sizes` (1 is one
+    broadcast per customer), and reports the HTTP round trips each run took.
+    """
+    reminder_list = [
+        {
+            "key": i,
+            "instance_id": "benchmark",
+            "template_name": "reminder",
+            "number": f"9665{i:08d}",
+            "components": [{"section_name": "body", "params": [{"type": "text", "text": f"*{i}*"}]}],
+        }
+        for i in range(int(reminders))
+    ]
+
+    results = []
+    for batch_size in [int(size) for size in str(batch_sizes).split(",")]:
+        messages = batch_reminder_messages(reminder_list, per_recipient_params=True, batch_size=batch_size)
+
+        with FakeGateway(latency=float(latency)) as gateway:
+            dispatcher = ReminderDispatcher(GatewayClient(gateway.url, "benchmark"), max_workers=workers, rate_per_instance=1000)
+
+            started = perf_counter()
+            outcomes = dispatcher.dispatch(messages)
+            elapsed = perf_counter() - started
+
+            round_trips = gateway.count("init_broadcast") + gateway.count("submit_broadcast")
+
+        results.append({
+            "batch_size": batch_size,
+            "broadcasts": len(messages),
+            "round_trips": round_trips,
+            "reminders_sent": sum(len(outcome["key"]) for outcome in outcomes if outcome["success"]),
+            "elapsed_s": round(elapsed, 3),
+        })
+
+    return results
+
+
+def gateway_session(calls: int = 200, latency: float = 0.0):
+    """
+    Sends `calls` submit_broadcast requests to a local fake gateway with a fresh
+    connection per call (the old bare requests.post) and over the pooled session.
+    """
+    results = []
+    for mode in ("requests.post", "pooled session"):
+        with FakeGateway(latency=float(latency)) as gateway:
+            if mode == "pooled session":
+                client = GatewayClient(gateway.url, "benchmark", session=get_session(), histogram=None)
+                send = client.submit_broadcast
+            else:
+                def send(reference_id, url=gateway.url):
+                    ## Same endpoint GatewayClient posts to; a 404 would make the comparison meaningless
+                    requests.post(
+                        f"{url}/{SUBMIT_BROADCAST_PATH}", json={"reference_id": reference_id}, timeout=10
+                    ).raise_for_status()
+
+            started = perf_counter()
+            for i in range(int(calls)):
+                send(str(i))
+            elapsed = perf_counter() - started
+
+            connections = gateway.connections
+
+        results.append({
+            "mode": mode,
+            "calls": int(calls),
+            "connections": connections,
+            "elapsed_s": round(elapsed, 3),
+            "avg_ms": round(elapsed * 1000 / int(calls), 3),
+        })
+
+    return results
+
+
+def pos_invoice_insert(template: str, runs: int = 20, deposit_used: float = 0):
+    """
+    Inserts copies of the `template` POS Invoice and reports the average insert latency
+    and query count for: no deposit, the deposit allocated before the first save (the
+    before_validate hook), and the previous set_advances() plus second save after insert.
+    Every invoice is rolled back. The template's customer needs a deposit balance.
+    """
+    source = frappe.get_doc("POS Invoice", template)
+    deposit_used = float(deposit_used or source.rounded_total or source.grand_total)
+
+    def make_invoice(use_deposit: bool):
+        invoice = frappe.copy_doc(source)
+        invoice.use_deposit = int(use_deposit)
+        invoice.deposit_used = deposit_used if use_deposit else 0
+        invoice.set("advances", [])
+        return invoice
+
+    def without_deposit():
+        make_invoice(False).insert()
+        frappe.db.rollback()
+
+    def allocated_before_save():
+        make_invoice(True).insert()
+        frappe.db.rollback()
+
+    def set_advances_after_insert():
+        ## The previous after_insert hook, without the before_validate allocation
+        frappe.flags.skip_deposit_allocation = True
+        try:
+            invoice = make_invoice(True)
+            invoice.insert()
+            invoice.set_advances()
+            invoice.save()
+        finally:
+            frappe.flags.skip_deposit_allocation = False
+            frappe.db.rollback()
+
+    results = []
+    for label, fn in (
+        ("without deposit", without_deposit),
+        ("deposit, allocated before save", allocated_before_save),
+        ("deposit, set_advances + save (previous)", set_advances_after_insert),
+    ):
+        queries, latency_ms = measure(fn, int(runs))
+        results.append({"mode": label, "queries": queries, "avg_ms": latency_ms})
+
+    return results
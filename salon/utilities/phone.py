@@ -0,0 +1,84 @@
+import re
+
+import frappe
+
+
+def canonical_mobile(number: str | None) -> str | None:
+	"""
+	Reduces the mobile formats found on Customers (+966 5..., 00966 5..., 05..., 5...)
+	to a single 9665XXXXXXXX form. Numbers that are not Saudi are kept as bare digits.
+	"""
+	digits = re.sub(r"\D", "", number or "")
+	if digits.startswith("00"):
+		digits = digits[2:]
+
+	if digits.startswith("966"):
+		core = digits[3:].lstrip("0")
+	elif digits.startswith("05") and len(digits) == 10:
+		core = digits[1:]
+	elif digits.startswith("5") and len(digits) == 9:
+		core = digits
+	else:
+		return digits or None
+
+	if len(core) != 9:
+		return digits
+
+	return f"966{core}"
+
+
+def find_customers_by_mobile(number: str, fields: list | None = None, filters: dict | None = None) -> list:
+	"""Looks customers up through the indexed canonical_mobile column."""
+	canonical = canonical_mobile(number)
+	if not canonical:
+		return []
+
+	return frappe.get_list(
+		"Customer",
+		filters={**(filters or {}), "canonical_mobile": canonical},
+		fields=fields or ["name"],
+	)
+
+
+### Customer: validate
+def set_canonical_mobile(doc, method=None):
+	doc.canonical_mobile = canonical_mobile(doc.mobile_no)
+
+
+def backfill_canonical_mobile(batch_size: int = 1000):
+	"""
+	Fills canonical_mobile for existing customers, walking the table by name in batches
+	and committing after each one so it can be stopped and re-run safely.
+	"""
+	last_name = ""
+	while True:
+		customers = frappe.db.sql(
+			"""
+            SELECT
+                name,
+                mobile_no,
+                canonical_mobile
+            FROM
+                `tabCustomer`
+            WHERE
+                name > %s
+            ORDER BY
+                name
+            LIMIT %s
+        """,
+			(last_name, int(batch_size)),
+			as_dict=True,
+		)
+
+		if not customers:
+			break
+
+		for customer in customers:
+			canonical = canonical_mobile(customer.mobile_no)
+			if canonical != customer.canonical_mobile:
+				frappe.db.set_value(
+					"Customer", customer.name, "canonical_mobile", canonical, update_modified=False
+				)
+
+		frappe.db.commit()
+		last_name = customers[-1].name
@@ -1,7 +1,11 @@
 import frappe
 from datetime import datetime, timedelta
-from frappe.utils import nowdate, add_days, get_datetime, date_diff, add_to_date
-import requests
+from frappe.utils import cint, flt, nowdate, now_datetime, add_days, get_datetime, date_diff, add_to_date
+from salon.whatsapp.dispatcher import ReminderDispatcher, batch_reminder_messages
+from salon.whatsapp.gateway import flush_latency_metrics, get_gateway_client
+from salon.whatsapp.templates import check_components
+
+REMINDER_LOG_BATCH_SIZE = 200
 
 def unify_mobile_number(number, document):
     """
@@ -32,27 +36,20 @@ def unify_mobile_number(number, document):
 
 # @frappe.whitelist(allow_guest=True)
 def send_appointment_reminder():
-    whatsapp_settings = frappe.get_doc("WhatsApp Settings", "WhatsApp Settings")
-    api_base_url = whatsapp_settings.api_url
-    api_key = whatsapp_settings.get_password("api_key")
+    whatsapp_settings = frappe.get_cached_doc("WhatsApp Settings")
 
     """
     Called every day to send reminders via WhatsApp or SMS
     """
-    def send_reminder_to_whatsapp(customer_name, customer_number, appointment_time, template_name):
-        template = frappe.get_doc("WhatsApp Template", template_name)
-        whatsapp_number = frappe.get_doc("WhatsApp Number", template.whatsapp_number)
-
-        url = f"{api_base_url}/whatsapp_integration.whatsapp_integration.doctype.whatsapp_broadcast_message.whatsapp_broadcast_message.init_broadcast"
+    def build_reminder(key, customer_name, customer_number, appointment_time, template_name):
+        template = frappe.get_cached_doc("WhatsApp Template", template_name)
+        whatsapp_number = frappe.get_cached_doc("WhatsApp Number", template.whatsapp_number)
 
-        payload = {
+        return {
+            "key": key,
             "instance_id": whatsapp_number.instance_id,
-            "message_type": "template",
-            "text": None,
             "template_name": template_name,
-            "numbers": [
-                customer_number
-            ],
+            "number": customer_number,
             "components": [
                 {
                     "section_name": "body",
@@ -69,92 +66,166 @@ def send_appointment_reminder():
                 }
             ]
         }
-        headers = {"Authorization": f"Basic {api_key}"}
-        response = requests.post(url, headers=headers, json=payload)
 
-        if response.status_code == 200:
-            data = response.json()["message"]
+    ## Payloads are checked against the synced template once per template and run;
+    ## reminders of an invalid template are skipped and picked up again next run
+    template_errors = {}
+
+    def build_messages(reminders):
+        valid = []
+        for reminder in reminders:
+            template_name = reminder["template_name"]
+            if template_name not in template_errors:
+                template_errors[template_name] = check_components(template_name, reminder["components"])
+
+                if template_errors[template_name]:
+                    frappe.log_error(
+                        title="Appointment Reminder Failed",
+                        message=template_errors[template_name],
+                        reference_doctype="WhatsApp Template",
+                        reference_name=template_name,
+                    )
 
-            if data.get("success"):
-                reference_id = data.get("reference_id")
+            if not template_errors[template_name]:
+                valid.append(reminder)
 
-                url = f"{api_base_url}/whatsapp_integration.whatsapp_integration.doctype.whatsapp_broadcast_message.whatsapp_broadcast_message.submit_broadcast"
-                payload = {
-                    "reference_id": reference_id
-                }
-                response = requests.post(url, headers=headers, json=payload)
+        return batch_reminder_messages(
+            valid,
+            per_recipient_params=cint(whatsapp_settings.supports_recipient_params),
+            batch_size=cint(whatsapp_settings.broadcast_batch_size) or 100,
+        )
+
+    dispatcher = ReminderDispatcher(
+        get_gateway_client(),
+        max_workers=cint(whatsapp_settings.reminder_workers) or 8,
+        rate_per_instance=flt(whatsapp_settings.messages_per_second) or 5,
+        max_retries=cint(whatsapp_settings.max_retries),
+    )
 
-    
     today = nowdate()
 
     schedules = frappe.get_all(
         "Appointment Reminder Schedule",
         filters={"enabled": 1},
-        fields=["name", "channel", "whatsapp_template", "before_date"]
+        fields=["name", "before_date"]
     )
+    days = [add_to_date(today, seconds=int(s.before_date)) for s in schedules]
+
+    ## One pass over every (appointment, schedule) pair that is due and was not reminded:
+    ## not by this schedule, and not by any schedule today
+    candidates = frappe.db.sql("""
+        SELECT 
+            t1.name, 
+            t1.party, 
+            t1.customer_name, 
+            t1.customer_email, 
+            t1.customer_phone_number,
+            t1.scheduled_time,
+            c.canonical_mobile,
+            s.name AS schedule,
+            s.channel,
+            s.whatsapp_template
+        FROM 
+            `tabAppointment` AS t1
+        INNER JOIN
+            `tabAppointment Reminder Schedule` AS s
+                ON s.enabled = 1
+                AND t1.selected_date <= DATE_ADD(%(today)s, INTERVAL s.before_date SECOND)
+        LEFT JOIN
+            `tabCustomer` AS c ON c.name = t1.party
+        LEFT JOIN
+            `tabAppointment Reminder Log` AS sent_by_schedule
+                ON sent_by_schedule.appointment = t1.name
+                AND sent_by_schedule.schedule = s.name
+        LEFT JOIN
+            `tabAppointment Reminder Log` AS sent_today
+                ON sent_today.appointment = t1.name
+                AND sent_today.sent_date = %(today)s
+        WHERE 
+            t1.status IN ('Open', 'Confirmed')
+            AND t1.selected_date >= %(today)s
+            AND sent_by_schedule.name IS NULL
+            AND sent_today.name IS NULL
+        ORDER BY
+            t1.selected_date ASC, s.modified DESC
+    """, {"today": today}, as_dict=True)
+
+    batch = []
+    reminded = set()
+    for ap in candidates:
+        ## Only one reminder per appointment and day, from the first matching schedule
+        if ap.name in reminded:
+            continue
+        reminded.add(ap.name)
+
+        customer_number = ap.canonical_mobile or unify_mobile_number(ap.customer_phone_number, ap)
+
+        ## Invalid customer number
+        if customer_number == None:
+            continue
+
+        batch.append((ap, customer_number))
+        if len(batch) >= REMINDER_LOG_BATCH_SIZE:
+            send_reminder_batch(batch, dispatcher, build_reminder, build_messages, today)
+            batch = []
+
+    send_reminder_batch(batch, dispatcher, build_reminder, build_messages, today)
 
-    days = []
-    for s in schedules:
-        threshold_datetime = add_to_date(today, seconds=int(s.before_date))
-        days.append(threshold_datetime)
-        # threshold_date_str = threshold_datetime.strftime("%Y-%m-%d")
-
-        appointments_to_remind = frappe.db.sql("""
-            SELECT 
-                t1.name, 
-                t1.party, 
-                t1.customer_name, 
-                t1.customer_email, 
-                t1.customer_phone_number,
-                t1.scheduled_time
-            FROM 
-                `tabAppointment` AS t1
-            WHERE 
-                t1.status IN ('Open', 'Confirmed')
-                AND t1.selected_date >= %s
-                AND t1.selected_date <= %s
-            ORDER BY
-                t1.selected_date ASC
-        """, (today, threshold_datetime, ), as_dict=True)
-
-        for ap in appointments_to_remind:
-            ## Skip if the reminder was sent already
-            if frappe.db.exists("Appointment Reminder Log", {"appointment": ap.name, "schedule": s.name}):
-                continue
-
-            ## Skip if another reminder was sent on the same day
-            if frappe.db.exists("Appointment Reminder Log", {"appointment": ap.name, "sent_date": today}):
-                continue
-
-            customer_number = unify_mobile_number(ap.customer_phone_number, ap)
-
-            ## Invalid customer number
-            if customer_number == None:
-                continue
-            
-            try:
-                ## Send reminder
-                if s.channel == "WhatsApp" or s.channel == "WhatsApp & SMS":
-                    response = send_reminder_to_whatsapp(
-                        ap.customer_name,
-                        customer_number,
-                        ap.scheduled_time,
-                        s.whatsapp_template,
-                    )
+    return days
 
-                if s.channel == "SMS" or s.channel == "WhatsApp & SMS":
-                    pass
-                
-                ## Save reminder logs
-                log = frappe.new_doc("Appointment Reminder Log")
-                log.appointment = ap.name
-                log.schedule = s.name
-                log.sent_date = today
-                log.insert(ignore_permissions=True)
-            except Exception as e:
-                frappe.throw(str(e))
-                pass
-
-        frappe.db.commit()
 
-    return days
+def send_reminder_batch(batch, dispatcher, build_reminder, build_messages, today):
+    """
+    Sends a batch of reminders as multi-recipient broadcasts through the dispatcher,
+    then records the outcome of each reminder: a reminder log when it went out,
+    an error log when it did not.
+    """
+    logs = []
+    reminders = []
+    for ap, customer_number in batch:
+        key = (ap.name, ap.schedule)
+
+        if ap.channel == "WhatsApp" or ap.channel == "WhatsApp & SMS":
+            reminders.append(build_reminder(
+                key,
+                ap.customer_name,
+                customer_number,
+                ap.scheduled_time,
+                ap.whatsapp_template,
+            ))
+        elif ap.channel == "SMS":
+            logs.append(key)
+
+    for outcome in dispatcher.dispatch(build_messages(reminders)):
+        if outcome["success"]:
+            logs.extend(outcome["key"])
+            continue
+
+        for appointment, schedule in outcome["key"]:
+            frappe.log_error(
+                title="Appointment Reminder Failed",
+                message=f"Schedule {schedule}, {outcome['attempts']} attempt(s): {outcome['error']}",
+                reference_doctype="Appointment",
+                reference_name=appointment,
+            )
+
+    save_reminder_logs(logs, today)
+    flush_latency_metrics()
+
+
+def save_reminder_logs(logs, sent_date):
+    """Writes the reminder logs of a batch in one statement and commits the batch."""
+    if not logs:
+        return
+
+    now = now_datetime()
+    frappe.db.bulk_insert(
+        "Appointment Reminder Log",
+        fields=["name", "creation", "modified", "owner", "modified_by", "appointment", "schedule", "sent_date"],
+        values=[
+            (frappe.generate_hash(length=10), now, now, frappe.session.user, frappe.session.user,
+             appointment, schedule, sent_date)
+            for appointment, schedule in logs
+        ],
+    )
+    frappe.db.commit()
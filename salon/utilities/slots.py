@@ -0,0 +1,299 @@
+from datetime import datetime, timedelta
+
+import frappe
+from frappe.utils import cint, get_datetime, now_datetime, nowdate
+
+from salon.utilities.availability import (
+	Occupancy,
+	get_shift_setting,
+	iter_slot_windows,
+	load_appointment_intervals,
+	parse_date,
+)
+
+SLOT_HORIZON_DAYS = 30
+
+
+def seed_slots(
+	employee: str | None = None, department: str | None = None, from_date=None, days: int = SLOT_HORIZON_DAYS
+):
+	"""
+	Rebuilds the Appointment Slot table from Appointment Setting for the next `days` days.
+	`booked` holds the peak number of the employee's Open appointments running at once in
+	each slot, the same count the booking path writes. The employees are locked while their
+	slots are replaced, so a booking never interleaves with the reseed.
+
+	Runs daily from the scheduler for every employee, and for a single employee/department
+	whenever one of their Appointment Settings changes.
+	"""
+	range_start = parse_date(from_date or nowdate())
+	range_end = range_start + timedelta(days=cint(days) - 1)
+
+	filters = {}
+	if employee:
+		filters["employee"] = employee
+	if department:
+		filters["department"] = department
+
+	settings = {}
+	for setting in frappe.get_all(
+		"Appointment Setting",
+		filters=filters,
+		fields=["name", "employee", "department", "weekday", "customers_capacity", "duration", "from", "to"],
+	):
+		settings.setdefault((setting.employee, setting.department, cint(setting.weekday)), setting)
+
+	employees = list({setting.employee for setting in settings.values()})
+	lock_employees(employees)
+
+	frappe.db.delete("Appointment Slot", {**filters, "slot_start": [">=", range_start]})
+	if not filters:
+		frappe.db.delete("Appointment Slot", {"slot_end": ["<", range_start]})
+
+	intervals = load_appointment_intervals(employees, range_start, range_end, for_update=True)
+	occupancies = {}
+
+	now = now_datetime()
+	values = []
+	day = range_start
+	while day <= range_end:
+		for (setting_employee, setting_department, weekday), setting in settings.items():
+			if weekday != day.weekday():
+				continue
+
+			duration = int(setting.duration or 1800)
+			if (setting_employee, duration) not in occupancies:
+				occupancies[(setting_employee, duration)] = Occupancy.from_rows(
+					intervals.get(setting_employee, []), duration
+				)
+			occupancy = occupancies[(setting_employee, duration)]
+
+			try:
+				windows = list(iter_slot_windows(day, setting))
+			except ValueError:
+				continue
+
+			for slot_start, slot_end in windows:
+				values.append(
+					(
+						frappe.generate_hash(length=10),
+						now,
+						now,
+						frappe.session.user,
+						frappe.session.user,
+						setting_employee,
+						setting_department,
+						slot_start,
+						slot_end,
+						cint(setting.customers_capacity),
+						occupancy.peak(slot_start, slot_end),
+					)
+				)
+
+		day += timedelta(days=1)
+
+	frappe.db.bulk_insert(
+		"Appointment Slot",
+		fields=[
+			"name",
+			"creation",
+			"modified",
+			"owner",
+			"modified_by",
+			"employee",
+			"department",
+			"slot_start",
+			"slot_end",
+			"capacity",
+			"booked",
+		],
+		values=values,
+		ignore_duplicates=True,
+	)
+
+	return len(values)
+
+
+def lock_employees(employees) -> None:
+	"""
+	Row locks on the employees, in a stable order so two bookings never wait on each other
+	crosswise. Capacity is per employee, so every booking and reseed of an employee, in any
+	department, runs one after the other.
+	"""
+	employees = sorted({employee for employee in employees if employee})
+	if employees:
+		frappe.db.sql(
+			"""
+            SELECT name
+            FROM `tabEmployee`
+            WHERE name IN %(employees)s
+            ORDER BY name
+            FOR UPDATE
+        """,
+			{"employees": tuple(employees)},
+		)
+
+
+def refresh_slot_counts(employee: str, start: datetime, end: datetime, occupancy: Occupancy):
+	"""
+	Rewrites `booked` of the employee's slots (in every department) overlapping the window
+	from `occupancy`, the same peak count seed_slots writes. Call with the employee locked.
+	"""
+	slots = frappe.db.sql(
+		"""
+        SELECT
+            t1.name,
+            t1.slot_start,
+            t1.slot_end,
+            t1.booked
+        FROM
+            `tabAppointment Slot` AS t1
+        WHERE
+            t1.employee = %(employee)s
+            AND t1.slot_start >= %(day_start)s
+            AND t1.slot_start < %(end)s
+            AND t1.slot_end > %(start)s
+        FOR UPDATE
+    """,
+		{
+			"employee": employee,
+			"day_start": parse_date(start) - timedelta(days=1),
+			"start": start,
+			"end": end,
+		},
+		as_dict=True,
+	)
+
+	for slot in slots:
+		booked = occupancy.peak(slot.slot_start, slot.slot_end)
+		if booked != cint(slot.booked):
+			frappe.db.sql(
+				"""
+                UPDATE `tabAppointment Slot`
+                SET booked = %(booked)s
+                WHERE name = %(name)s
+            """,
+				{"name": slot.name, "booked": booked},
+			)
+
+
+def load_locked_intervals(employee: str, start: datetime, end: datetime, exclude: str | None = None) -> list:
+	"""The employee's Open appointments on the window's days, from a locking read that sees every committed booking."""
+	return load_appointment_intervals([employee], start, end, exclude=exclude, for_update=True).get(
+		employee, []
+	)
+
+
+def reserve_appointment_slots(doc, start: datetime, end: datetime, capacity: int, duration: int) -> int:
+	"""
+	Checks the employee's capacity for `start`-`end` and keeps their Appointment Slot
+	counters in step with the booking.
+
+	The Employee rows of the new and previous employee are locked first, so the check
+	re-reads the employee's Open appointments (across departments) after every competing
+	booking has committed. The check never depends on slot rows, which a reseed may be
+	replacing at the same moment; the slots of both windows are then recounted under the lock.
+
+	:return: peak number of guests already booked in the new window, excluding this appointment
+	"""
+	previous = doc.get_doc_before_save()
+	lock_employees([doc.employee, previous.employee if previous else None])
+
+	rows = load_locked_intervals(doc.employee, start, end, exclude=doc.name)
+	concurrent_count = Occupancy.from_rows(rows, duration).peak(start, end)
+
+	if doc.status == "Open" and concurrent_count >= capacity:
+		return concurrent_count
+
+	if previous and previous.status == "Open" and previous.employee and previous.scheduled_time:
+		previous_start = get_datetime(previous.scheduled_time)
+		previous_end = get_appointment_end(previous)
+		refresh_slot_counts(
+			previous.employee,
+			previous_start,
+			previous_end,
+			Occupancy.from_rows(
+				load_locked_intervals(previous.employee, previous_start, previous_end, exclude=doc.name),
+				duration,
+			),
+		)
+
+	if doc.status == "Open":
+		rows.append((start, end))
+	refresh_slot_counts(doc.employee, start, end, Occupancy.from_rows(rows, duration))
+
+	return concurrent_count
+
+
+def release_appointment_slots(appointment):
+	"""Recounts the slots a deleted Open appointment held."""
+	if (
+		not appointment
+		or appointment.status != "Open"
+		or not appointment.employee
+		or not appointment.scheduled_time
+	):
+		return
+
+	start = get_datetime(appointment.scheduled_time)
+	end = get_appointment_end(appointment)
+
+	lock_employees([appointment.employee])
+	refresh_slot_counts(
+		appointment.employee,
+		start,
+		end,
+		Occupancy.from_rows(
+			load_locked_intervals(appointment.employee, start, end, exclude=appointment.name),
+			int((end - start).total_seconds()),
+		),
+	)
+
+
+### Appointment: after_delete
+def on_appointment_delete(doc, method=None):
+	release_appointment_slots(doc)
+
+
+def get_appointment_end(appointment) -> datetime:
+	if appointment.scheduled_end_time:
+		return get_datetime(appointment.scheduled_end_time)
+
+	setting = get_shift_setting(
+		appointment.employee, appointment.department, get_datetime(appointment.scheduled_time).weekday()
+	)
+	duration = int(setting.duration or 1800) if setting else 1800
+	return get_datetime(appointment.scheduled_time) + timedelta(seconds=duration)
+
+
+def get_materialized_slots(employee: str, department: str, date):
+	"""
+	Answers the employee's slots for the date from the Appointment Slot table in one indexed
+	range scan. Returns None when the day has not been seeded, so the caller can compute it live.
+	"""
+	day_start = parse_date(date)
+
+	slots = frappe.get_all(
+		"Appointment Slot",
+		filters=[
+			["employee", "=", employee],
+			["department", "=", department],
+			["slot_start", ">=", day_start],
+			["slot_start", "<", day_start + timedelta(days=1)],
+		],
+		fields=["slot_start", "slot_end", "capacity", "booked"],
+		order_by="slot_start asc",
+	)
+	if not slots:
+		return None
+
+	return {
+		"times": [
+			{
+				"value": slot.slot_start.strftime("%H:%M:%S"),
+				"available": slot.capacity - slot.booked > 0,
+			}
+			for slot in slots
+		],
+		"duration": int((slots[0].slot_end - slots[0].slot_start).total_seconds()),
+	}
@@ -1,82 +1,44 @@
 import frappe
 from datetime import datetime, timedelta
-from salon.appointment_api import get_available_times
+from frappe.utils import cint, date_diff
+from salon.appointment_api import get_available_times, list_appointments
+from salon.utilities.availability import get_department_availability, get_shift_setting
+from salon.utilities.phone import find_customers_by_mobile
+from salon.whatsapp.catalog import (
+    build_permitted_catalog,
+    can_read_catalog_snapshot,
+    get_catalog_snapshot,
+    get_services,
+    load_departments,
+)
+from salon.whatsapp.inbox import store_webhook_event
+from werkzeug.wrappers import Response
 import json
 import math
 
-def normalize_saudi_mobile(mobile: str) -> dict:
-    mobile = mobile.strip().replace(" ", "").replace("-", "")
-
-    if mobile.startswith("966"):
-        core = mobile[-9:]
-    elif mobile.startswith("05"):
-        core = mobile[2:]
-    elif mobile.startswith("5"):
-        core = mobile
-    else:
-        core = mobile[-9:]
-
-    return {
-        "core": core,
-        "966": f"966{core}",
-        "05": f"05{core}",
-        "5": core,
-    }
+MAX_SEARCH_DAYS = 14
 
 
 @frappe.whitelist(allow_guest=True, methods=["POST"])
 def webhook():
-    def normalize_rating(rating: float) -> float:
-        return {
-            1.0: 0.2,
-            2.0: 0.4,
-            3.0: 0.6,
-            4.0: 0.8,
-            5.0: 1.0,
-        }[rating]
-
-    wa_settings = frappe.get_doc("WhatsApp Settings", "WhatsApp Settings")
-    try:
-        # raw_body = frappe.request.data
-        raw_data = frappe.request.get_data(as_text=True)
-        data = json.loads(raw_data)
-
-        interactive = data.get("interactive")
-        message_type = interactive.get("type")
-        if message_type == "list_reply":
-            reply = interactive.get("list_reply")
-            reply_id = reply.get("id")
-            reply_title = reply.get("title")
-            reply_description = reply.get("description")
-
-            review_id = reply_id.split("_")[0]
-            rating = float(reply_id.split("_")[1])
-
-            review = frappe.get_value("Service Review", {"name": review_id, "status": "Pending"})
-            if review:
-                review_doc = frappe.get_doc("Service Review", review_id)
-                review_doc.rating = normalize_rating(rating)
-                review_doc.rating_number = int(rating)
-                review_doc.description = reply_description
-                review_doc.status = "Reviewed"
-                review_doc.save(ignore_permissions=True)
-        
-                return {"success": True, "body": data, "review_id": review_doc.name, "rating": normalize_rating(rating)}
-    
-    except Exception as e:
-        frappe.throw(str(e))
+    """
+    Acknowledges gateway events straight away: the raw body is appended to the
+    WhatsApp Webhook Event inbox and processed by a background job (salon.whatsapp.inbox).
+    """
+    raw_data = frappe.request.get_data(as_text=True)
+
+    if not store_webhook_event(raw_data):
+        frappe.local.response["http_status_code"] = 400
+        return {"success": False, "error": "Expected a JSON object"}
+
+    return {"success": True}
 
 
 @frappe.whitelist(methods=["GET"])
 def check_customer(mobile_number: str):
     try:
-        numbers = normalize_saudi_mobile(mobile_number)
-
-        customers = frappe.get_list(
-            "Customer",
-            filters={
-                "mobile_no": ["in", [numbers["966"], numbers["05"], numbers["5"]]]
-            },
+        customers = find_customers_by_mobile(
+            mobile_number,
             fields=["name", "customer_name", "email_id", "mobile_no", "gender"]
         )
 
@@ -97,10 +59,10 @@ def check_customer(mobile_number: str):
 @frappe.whitelist(methods=["POST"])
 def create_customer(first_name: str, middle_name: str, last_name: str, mobile_number: str):
     try:
-        customers = frappe.get_list(
-            "Customer",
-            filters={"mobile_no": mobile_number, "customer_name": ["like", f"%{first_name} {middle_name} {last_name}%"]},
-            fields=["customer_name", "email_id", "mobile_no", "gender"]
+        customers = find_customers_by_mobile(
+            mobile_number,
+            fields=["customer_name", "email_id", "mobile_no", "gender"],
+            filters={"customer_name": ["like", f"%{first_name} {middle_name} {last_name}%"]},
         )
 
         if customers:
@@ -124,23 +86,20 @@ def create_customer(first_name: str, middle_name: str, last_name: str, mobile_nu
     
 
 @frappe.whitelist(methods=["GET"])
-def get_appointments(customer_id: str, from_date: str, to_date: str):
+def get_appointments(customer_id: str, from_date: str, to_date: str, after: str | None = None, page_length: int = 0):
     try:
-        appointments = frappe.get_list(
-            "Appointment",
-            filters=[
-                ["Appointment", "customer", "=", customer_id],
-                ["Appointment", "status", "=", "Open"],
-                ["Appointment", "selected_date", ">=", from_date],
-                ["Appointment", "selected_date", "<=", to_date],
-            ],
-            fields=["department", "employee", "scheduled_time", "scheduled_end_time"],
+        appointments = list_appointments(
+            customer=customer_id,
+            from_date=from_date,
+            to_date=to_date,
+            after=after,
+            page_length=page_length,
         )
-        for app in appointments:
-            employee_name = frappe.db.get_value("Employee", app.employee, "employee_name")
-            app.employee = employee_name
+        for app in appointments["appointments"]:
+            del app["name"]
 
-        frappe.response["my_appointments"] = appointments
+        frappe.response["my_appointments"] = appointments["appointments"]
+        frappe.response["next_cursor"] = appointments["next_cursor"]
         return
     
     except Exception as e:
@@ -159,10 +118,11 @@ def create_appointment(
     customer_mobile_number: str,
 ):
     try:
-        customer_id = frappe.get_value(
-            "Customer",
-            {"customer_name": customer_name, "mobile_no": customer_mobile_number},
+        customers = find_customers_by_mobile(
+            customer_mobile_number,
+            filters={"customer_name": customer_name},
         )
+        customer_id = customers[0].name if customers else None
         if not customer_id:
             frappe.response["message"] = f"({customer_name}) customer with mobile number ({customer_mobile_number}) is not registered."
             return
@@ -170,21 +130,13 @@ def create_appointment(
         date = datetime.strptime(selected_date, "%Y-%m-%d")
         weekday = date.weekday()
 
-        app_settings = frappe.get_list(
-            "Appointment Setting",
-            filters = {
-                "employee": employee,
-                "department": department,
-                "weekday": str(weekday),
-            },
-            fields=["name", "customers_capacity", "duration", "from", "to"]
-        )
+        app_setting = get_shift_setting(employee, department, weekday)
 
-        if not app_settings:
+        if not app_setting:
             frappe.response["message"] = f"The employee is not available on {selected_date} {selected_time}"
             return
         
-        duration_seconds = app_settings[0].duration
+        duration_seconds = app_setting.duration
         start_datetime = datetime.strptime(f"{selected_date} {selected_time}", "%Y-%m-%d %H:%M:%S")
         end_datetime = start_datetime + timedelta(seconds=duration_seconds)
 
@@ -212,19 +164,7 @@ def create_appointment(
 @frappe.whitelist(methods=["GET"])
 def get_departments():
     try:
-        departments = frappe.get_list(
-            "Item Group",
-            filters={
-                "parent_item_group": ["in", ["Services", "الشعر", "هايلايت وتقنيات الصبغة"]],
-                "name": ["!=", "الشعر"],
-            },
-            limit=0,
-        )
-        deps = []
-        for dep in departments:
-            deps.append(dep.name)
-
-        frappe.response["departments"] = deps
+        frappe.response["departments"] = load_departments()
         return
     
     except Exception as e:
@@ -233,36 +173,12 @@ def get_departments():
 
 
 @frappe.whitelist(methods=["GET"])
-def get_all_services(language: str="ar"):
+def get_all_services(language: str="ar", start: int=0, page_length: int=0):
     try:
-        fields = ["name"]
-
-        if language == "ar":
-            fields.append("item_name_in_arabic")
-            fields.append("description_in_arabic")
-        else:
-            fields.append("description")
-
+        catalog = get_services(language=language, start=start, page_length=page_length)
 
-        services = frappe.get_list(
-            "Item",
-            fields=fields,
-            limit=0,
-        )
-
-        for service in services:
-            item_price = frappe.get_list(
-                "Item Price",
-                filters={"item_code": service.name, "selling": 1},
-                fields=["price_list_rate"],
-                limit=1,
-            )
-            if item_price:
-                service.vat_exclusive_price = item_price[0].price_list_rate
-            else:
-                service.vat_exclusive_price = "Unspecified"
-
-        frappe.response["services"] = services
+        frappe.response["services"] = catalog["services"]
+        frappe.response["total_count"] = catalog["total_count"]
         return
     
     except Exception as e:
@@ -271,38 +187,17 @@ def get_all_services(language: str="ar"):
     
 
 @frappe.whitelist(methods=["GET"])
-def get_services_by_department(department: str, language: str="ar"):
+def get_services_by_department(department: str, language: str="ar", start: int=0, page_length: int=0):
     try:
-        fields = ["name"]
-
-        if language == "ar":
-            fields.append("item_name_in_arabic")
-            fields.append("description_in_arabic")
-        else:
-            fields.append("description")
-
-        services = frappe.get_list(
-            "Item",
-            filters={
-                "item_group": department,
-            },
-            fields=fields,
-            limit=0,
+        catalog = get_services(
+            language=language,
+            department=department,
+            start=start,
+            page_length=page_length,
         )
 
-        for service in services:
-            item_price = frappe.get_list(
-                "Item Price",
-                filters={"item_code": service.name, "selling": 1},
-                fields=["price_list_rate"],
-                limit=1,
-            )
-            if item_price:
-                service.vat_exclusive_price = item_price[0].price_list_rate
-            else:
-                service.vat_exclusive_price = "Unspecified"
-
-        frappe.response["services"] = services
+        frappe.response["services"] = catalog["services"]
+        frappe.response["total_count"] = catalog["total_count"]
         return
     
     except Exception as e:
@@ -387,4 +282,76 @@ def get_times(date: str, department: str, employee: str):
     
     except Exception as e:
         frappe.response["message"] = f"Failed to fetch available times: {e}"
-        return
\ No newline at end of file
+        return
+
+
+@frappe.whitelist(methods=["GET"])
+def search_available_times(department: str, from_date: str, to_date: str | None = None):
+    try:
+        to_date = to_date or from_date
+        if date_diff(to_date, from_date) > MAX_SEARCH_DAYS:
+            frappe.response["message"] = f"The search range can not exceed {MAX_SEARCH_DAYS} days"
+            return
+
+        selected_department = frappe.get_doc("Item Group", department)
+        employee_names = {emp.employee: emp.employee_name for emp in selected_department.employees}
+
+        availability = get_department_availability(
+            department=department,
+            employees=list(employee_names),
+            from_date=from_date,
+            to_date=to_date,
+        )
+
+        if not availability:
+            frappe.response["message"] = f"no available times between {from_date} and {to_date}"
+            return
+
+        for row in availability:
+            row["employee_name"] = employee_names.get(row["employee"])
+
+        frappe.response["availability"] = availability
+        return
+
+    except Exception as e:
+        frappe.response["message"] = f"Failed to search available times: {e}"
+        return
+
+
+
+@frappe.whitelist(methods=["GET"])
+def get_catalog(version: str | None = None, compressed: int = 0):
+    """
+    Departments, services and employees in one versioned JSON document.
+    Clients send the version they hold (`version` or If-None-Match) and get 304 when it is current.
+    Users restricted by User Permissions get their filtered catalog, unversioned.
+    """
+    try:
+        if not can_read_catalog_snapshot():
+            return Response(build_permitted_catalog(), status=200, mimetype="application/json")
+
+        snapshot = get_catalog_snapshot()
+
+        if version:
+            current = version.strip().strip('"') == snapshot["version"]
+        else:
+            current = frappe.request.if_none_match.contains_weak(snapshot["version"])
+
+        if current:
+            response = Response(status=304)
+        elif cint(compressed):
+            ## Serve the precomputed bytes as they are instead of re-serialising the catalog
+            response = Response(snapshot["gzip"], status=200, mimetype="application/json")
+            response.headers["Content-Encoding"] = "gzip"
+        else:
+            response = Response(snapshot["body"], status=200, mimetype="application/json")
+
+        response.set_etag(snapshot["version"])
+        return response
+
+    except frappe.PermissionError:
+        raise
+
+    except Exception as e:
+        frappe.response["message"] = f"Failed to fetch catalog: {e}"
+        return
@@ -0,0 +1,336 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import frappe
+from frappe.utils import cint, flt, now_datetime
+
+from salon.utilities.phone import canonical_mobile
+from salon.whatsapp.dispatcher import ReminderDispatcher
+from salon.whatsapp.gateway import (
+	INIT_BROADCAST_PATH,
+	SUBMIT_BROADCAST_PATH,
+	GatewayError,
+	get_gateway_client,
+)
+
+BROADCAST_CHUNK_SIZE = 1000
+RECIPIENT_PAGE_SIZE = 5000
+CHUNK_PLAN_PAGE_SIZE = 50
+
+
+def iter_table_numbers(broadcast: str, page_size: int = RECIPIENT_PAGE_SIZE):
+	"""Yields (idx, number) from the broadcast's numbers table, one keyset page at a time."""
+	last_idx = 0
+	while True:
+		rows = frappe.db.sql(
+			"""
+            SELECT
+                idx,
+                number
+            FROM
+                `tabWhatsApp Numbers Table`
+            WHERE
+                parent = %(broadcast)s
+                AND parenttype = 'WhatsApp Message Broadcast'
+                AND parentfield = 'numbers'
+                AND idx > %(last_idx)s
+            ORDER BY
+                idx
+            LIMIT %(page_size)s
+        """,
+			{"broadcast": broadcast, "last_idx": last_idx, "page_size": page_size},
+		)
+
+		if not rows:
+			return
+
+		yield from rows
+		last_idx = rows[-1][0]
+
+
+def iter_broadcast_numbers(doc):
+	"""(position, number) rows of the broadcast's recipients, streamed from its source."""
+	if doc.recipient_source == "Audience":
+		return frappe.get_doc("WhatsApp Audience", doc.audience).iter_numbers(RECIPIENT_PAGE_SIZE)
+
+	return iter_table_numbers(doc.name)
+
+
+def iter_recipient_chunks(rows, chunk_size: int = BROADCAST_CHUNK_SIZE):
+	"""
+	Normalises and deduplicates (position, number) rows on the fly and groups them into
+	chunks of up to `chunk_size` unique numbers. Used once per broadcast, by
+	plan_broadcast_chunks, which freezes the result.
+
+	:return: iterator of {"chunk_index", "first_idx", "last_idx", "numbers"}
+	"""
+	seen = set()
+	chunk = None
+	chunk_index = 0
+
+	for idx, number in rows:
+		if chunk is None:
+			chunk = {"chunk_index": chunk_index, "first_idx": idx, "last_idx": idx, "numbers": []}
+
+		chunk["last_idx"] = idx
+
+		number = canonical_mobile(number)
+		if not number or number in seen:
+			continue
+
+		seen.add(number)
+		chunk["numbers"].append(number)
+
+		if len(chunk["numbers"]) >= chunk_size:
+			yield chunk
+			chunk = None
+			chunk_index += 1
+
+	if chunk and chunk["numbers"]:
+		yield chunk
+
+
+def get_broadcast_chunks(broadcast: str) -> dict:
+	return {
+		chunk.chunk_index: chunk
+		for chunk in frappe.get_all(
+			"WhatsApp Broadcast Chunk",
+			filters={"broadcast": broadcast},
+			fields=["name", "chunk_index", "status", "reference_id", "attempts"],
+		)
+	}
+
+
+def plan_broadcast_chunks(doc, chunk_size: int = BROADCAST_CHUNK_SIZE) -> dict:
+	"""
+	Freezes the broadcast's recipients into Pending chunks, streamed from its source and
+	written a page at a time, and records the chunk count once every chunk is written.
+	Later runs send from the frozen chunks, so an audience that changes while a broadcast
+	is resumed can neither move chunk boundaries nor skip or repeat anyone. A plan cut
+	short by a crash was never sent from and is simply rebuilt.
+	"""
+	if cint(doc.chunk_count):
+		return get_broadcast_chunks(doc.name)
+
+	frappe.db.delete("WhatsApp Broadcast Chunk", {"broadcast": doc.name})
+
+	fields = [
+		"name",
+		"creation",
+		"modified",
+		"owner",
+		"modified_by",
+		"broadcast",
+		"chunk_index",
+		"status",
+		"first_idx",
+		"last_idx",
+		"recipients",
+		"numbers",
+	]
+	now = now_datetime()
+	count = 0
+	page = []
+
+	for chunk in iter_recipient_chunks(iter_broadcast_numbers(doc), chunk_size):
+		page.append(
+			(
+				frappe.generate_hash(length=10),
+				now,
+				now,
+				frappe.session.user,
+				frappe.session.user,
+				doc.name,
+				chunk["chunk_index"],
+				"Pending",
+				chunk["first_idx"],
+				chunk["last_idx"],
+				len(chunk["numbers"]),
+				"\n".join(chunk["numbers"]),
+			)
+		)
+		count += 1
+
+		if len(page) >= CHUNK_PLAN_PAGE_SIZE:
+			frappe.db.bulk_insert("WhatsApp Broadcast Chunk", fields=fields, values=page)
+			page = []
+
+	if page:
+		frappe.db.bulk_insert("WhatsApp Broadcast Chunk", fields=fields, values=page)
+
+	doc.db_set("chunk_count", count)
+	frappe.db.commit()
+
+	return get_broadcast_chunks(doc.name)
+
+
+def get_chunk_dispatcher() -> ReminderDispatcher:
+	settings = frappe.get_cached_doc("WhatsApp Settings")
+
+	return ReminderDispatcher(
+		get_gateway_client(),
+		max_workers=cint(settings.reminder_workers) or 8,
+		rate_per_instance=flt(settings.messages_per_second) or 5,
+		max_retries=cint(settings.max_retries),
+	)
+
+
+def call_gateway(dispatcher: ReminderDispatcher, path: str, instance_id: str, payload: dict) -> dict:
+	"""One gateway call with the dispatcher's rate limit and retries. Safe to run in a thread."""
+	outcome = {"attempts": 0, "data": None, "error": None}
+	try:
+		outcome["data"] = dispatcher.post(path, instance_id, payload, outcome)
+	except GatewayError as e:
+		outcome["error"] = str(e)
+
+	return outcome
+
+
+def init_broadcast_chunks(doc, request_body: dict, progress=None) -> list:
+	"""
+	Freezes the recipients into chunks, then initialises every chunk that is not
+	initialised yet, `max_workers` chunks at a time. Each wave is recorded and committed
+	before the next one is loaded, so a crashed run resumes from its last wave.
+
+	:return: errors of the chunks that failed
+	"""
+	settings = frappe.get_cached_doc("WhatsApp Settings")
+	chunk_size = cint(settings.broadcast_chunk_size) or BROADCAST_CHUNK_SIZE
+
+	chunks = plan_broadcast_chunks(doc, chunk_size)
+	dispatcher = get_chunk_dispatcher()
+	instance_id = request_body["instance_id"]
+
+	errors = []
+	initialised = sum(1 for chunk in chunks.values() if chunk.status in ("Initialised", "Submitted"))
+	pending = [chunks[index] for index in sorted(chunks) if chunks[index].status in ("Pending", "Failed")]
+
+	for i in range(0, len(pending), dispatcher.max_workers):
+		wave = pending[i : i + dispatcher.max_workers]
+		numbers = dict(
+			frappe.get_all(
+				"WhatsApp Broadcast Chunk",
+				filters={"name": ["in", [chunk.name for chunk in wave]]},
+				fields=["name", "numbers"],
+				as_list=True,
+			)
+		)
+
+		with ThreadPoolExecutor(max_workers=len(wave)) as executor:
+			outcomes = list(
+				executor.map(
+					lambda chunk: call_gateway(
+						dispatcher,
+						INIT_BROADCAST_PATH,
+						instance_id,
+						{**request_body, "numbers": (numbers[chunk.name] or "").split("\n")},
+					),
+					wave,
+				)
+			)
+
+		for chunk, outcome in zip(wave, outcomes, strict=True):
+			record_chunk(chunk, outcome)
+			if outcome["error"]:
+				errors.append(f"Chunk {chunk.chunk_index}: {outcome['error']}")
+			else:
+				initialised += 1
+
+		frappe.db.commit()
+		if progress:
+			progress(f"Initialised {initialised} chunk(s)")
+
+	return errors
+
+
+def record_chunk(chunk, outcome: dict):
+	frappe.db.set_value(
+		"WhatsApp Broadcast Chunk",
+		chunk.name,
+		{
+			"status": "Failed" if outcome["error"] else "Initialised",
+			"reference_id": (outcome["data"] or {}).get("reference_id"),
+			"error": outcome["error"],
+			"attempts": cint(chunk.attempts) + outcome["attempts"],
+		},
+	)
+
+
+def submit_broadcast_chunks(doc, progress=None) -> list:
+	"""
+	Submits every initialised chunk of the broadcast concurrently within the gateway
+	rate limit, recording each chunk as it completes. A chunk whose submit fails stays
+	Initialised with the error, so a retry submits it again under the same reference.
+
+	:return: errors of the chunks that failed
+	"""
+	pending = [chunk for chunk in get_broadcast_chunks(doc.name).values() if chunk.status == "Initialised"]
+	if not pending:
+		return []
+
+	dispatcher = get_chunk_dispatcher()
+	instance_id = frappe.get_cached_doc("WhatsApp Number", doc.whatsapp_number).instance_id
+
+	with ThreadPoolExecutor(max_workers=min(dispatcher.max_workers, len(pending))) as executor:
+		outcomes = executor.map(
+			lambda chunk: call_gateway(
+				dispatcher, SUBMIT_BROADCAST_PATH, instance_id, {"reference_id": chunk.reference_id}
+			),
+			pending,
+		)
+
+		errors = []
+		for submitted, (chunk, outcome) in enumerate(zip(pending, outcomes, strict=True), start=1):
+			frappe.db.set_value(
+				"WhatsApp Broadcast Chunk",
+				chunk.name,
+				{
+					"status": "Initialised" if outcome["error"] else "Submitted",
+					"error": outcome["error"],
+					"attempts": cint(chunk.attempts) + outcome["attempts"],
+				},
+			)
+			frappe.db.commit()
+
+			if outcome["error"]:
+				errors.append(f"Chunk {chunk.chunk_index}: {outcome['error']}")
+			elif progress and (submitted % dispatcher.max_workers == 0 or submitted == len(pending)):
+				progress(f"Submitted {submitted - len(errors)} of {len(pending)} chunk(s)")
+
+	return errors
+
+
+def resume_stalled_broadcasts(stalled_after_minutes: int = 15):
+	"""
+	Re-enqueues broadcasts whose job died mid-way: Queued and Initialising ones are
+	initialised again, and Submitting ones (or submitted Initialised ones) get their
+	remaining chunks submitted. Finished chunks are skipped, and jobs that are still
+	running are not duplicated.
+	"""
+	from salon.whatsapp.doctype.whatsapp_message_broadcast.whatsapp_message_broadcast import (
+		enqueue_broadcast_step,
+	)
+
+	stalled = frappe.db.sql(
+		"""
+        SELECT
+            b.name,
+            b.status
+        FROM
+            `tabWhatsApp Message Broadcast` AS b
+        WHERE
+            b.modified < NOW() - INTERVAL %(minutes)s MINUTE
+            AND (
+                (b.status IN ('Queued', 'Initialising') AND b.docstatus < 2)
+                OR (b.status IN ('Initialised', 'Submitting') AND b.docstatus = 1)
+            )
+    """,
+		{"minutes": cint(stalled_after_minutes)},
+		as_dict=True,
+	)
+
+	for broadcast in stalled:
+		enqueue_broadcast_step(
+			broadcast.name,
+			"init" if broadcast.status in ("Queued", "Initialising") else "submit",
+			resume=True,
+		)
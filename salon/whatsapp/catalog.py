@@ -0,0 +1,214 @@
+import gzip
+import hashlib
+import json
+
+import frappe
+from frappe.core.doctype.user_permission.user_permission import get_user_permissions
+from frappe.utils import cint, now
+from frappe.utils.response import json_handler
+
+SERVICE_CATALOG_CACHE_KEY = "salon:service_catalog"
+CATALOG_SNAPSHOT_CACHE_KEY = "salon:catalog_snapshot"
+
+
+def get_language_fields(language: str) -> list:
+	if language == "ar":
+		return ["item_name_in_arabic", "description_in_arabic"]
+
+	return ["description"]
+
+
+def load_service_catalog(language: str) -> list:
+	"""
+	Loads every Item with its most recently modified selling price in a single query.
+	Items without a selling Item Price are priced "Unspecified".
+	"""
+	fields = ", ".join(
+		f"item.`{fieldname}`" for fieldname in ["name", "item_group", *get_language_fields(language)]
+	)
+
+	services = frappe.db.sql(
+		f"""
+        SELECT
+            {fields},
+            price.price_list_rate AS vat_exclusive_price
+        FROM
+            `tabItem` AS item
+        LEFT JOIN
+            `tabItem Price` AS price ON price.name = (
+                SELECT
+                    latest.name
+                FROM
+                    `tabItem Price` AS latest
+                WHERE
+                    latest.item_code = item.name
+                    AND latest.selling = 1
+                ORDER BY
+                    latest.modified DESC
+                LIMIT 1
+            )
+        ORDER BY
+            item.modified DESC, item.name
+    """,
+		as_dict=True,
+	)
+
+	for service in services:
+		if service.vat_exclusive_price is None:
+			service.vat_exclusive_price = "Unspecified"
+
+	return services
+
+
+def filter_permitted_services(catalog: list) -> list:
+	"""
+	The cached catalog is shared by every user, so the read permission and the user's
+	User Permissions are applied when it is served, as frappe.get_list did before.
+	"""
+	frappe.has_permission("Item", "read", throw=True)
+	frappe.has_permission("Item Price", "read", throw=True)
+
+	if not get_user_permissions():
+		return catalog
+
+	permitted = set(frappe.get_list("Item", pluck="name", limit=0))
+	return [service for service in catalog if service.name in permitted]
+
+
+def get_service_catalog(language: str) -> list:
+	"""Every service for the language, unfiltered, from the per-language cache."""
+	return frappe.cache.hget(
+		SERVICE_CATALOG_CACHE_KEY, language, generator=lambda: load_service_catalog(language)
+	)
+
+
+def get_services(
+	language: str = "ar", department: str | None = None, start: int = 0, page_length: int = 0
+) -> dict:
+	"""
+	Serves a page of the cached catalog snapshot for the language.
+	`page_length` 0 returns everything from `start` on.
+	"""
+	language = "ar" if language == "ar" else "en"
+
+	catalog = filter_permitted_services(get_service_catalog(language))
+
+	if department:
+		catalog = [service for service in catalog if service.item_group == department]
+
+	start = cint(start)
+	page_length = cint(page_length)
+	page = catalog[start : start + page_length] if page_length else catalog[start:]
+
+	return {
+		"services": [
+			frappe._dict({key: value for key, value in service.items() if key != "item_group"})
+			for service in page
+		],
+		"total_count": len(catalog),
+	}
+
+
+def load_departments(unrestricted: bool = False) -> list:
+	"""The service departments the user can read, or all of them when `unrestricted`."""
+	departments = (frappe.get_all if unrestricted else frappe.get_list)(
+		"Item Group",
+		filters={
+			"parent_item_group": ["in", ["Services", "الشعر", "هايلايت وتقنيات الصبغة"]],
+			"name": ["!=", "الشعر"],
+		},
+		limit=0,
+	)
+
+	return [dep.name for dep in departments]
+
+
+def load_department_employees(departments: list) -> dict:
+	employees = {}
+	for department in departments:
+		employees[department] = [
+			{"ID": emp.employee, "Name": emp.employee_name}
+			for emp in frappe.get_doc("Item Group", department).employees
+		]
+
+	return employees
+
+
+def build_catalog_snapshot() -> dict:
+	"""
+	Precomputes the departments, services and employees the bot needs into one JSON
+	document, versioned by its content hash, and stores it with a gzip copy in Redis.
+	The snapshot is shared by every user, so it is built without permission filters
+	whoever triggers the rebuild; permissions are checked when it is served.
+	"""
+	departments = load_departments(unrestricted=True)
+	body = dump_catalog(
+		{
+			"departments": departments,
+			"services": {language: load_service_catalog(language) for language in ("ar", "en")},
+			"employees": load_department_employees(departments),
+		}
+	)
+
+	snapshot = {
+		"version": hashlib.sha256(body).hexdigest()[:16],
+		"built_at": now(),
+		"body": body,
+		"gzip": gzip.compress(body),
+	}
+	frappe.cache.set_value(CATALOG_SNAPSHOT_CACHE_KEY, snapshot)
+
+	return snapshot
+
+
+def build_permitted_catalog() -> bytes:
+	"""The catalog as the user's User Permissions allow, for users the shared snapshot can't serve."""
+	departments = load_departments()
+	return dump_catalog(
+		{
+			"departments": departments,
+			"services": {
+				language: filter_permitted_services(get_service_catalog(language))
+				for language in ("ar", "en")
+			},
+			"employees": load_department_employees(departments),
+		}
+	)
+
+
+def dump_catalog(catalog: dict) -> bytes:
+	return json.dumps(
+		catalog, default=json_handler, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+	).encode("utf-8")
+
+
+def can_read_catalog_snapshot() -> bool:
+	"""
+	Checks read access to every doctype in the catalog. Users restricted by User
+	Permissions can't be served the shared snapshot and get False.
+	"""
+	for doctype in ("Item", "Item Price", "Item Group"):
+		frappe.has_permission(doctype, "read", throw=True)
+
+	return not get_user_permissions()
+
+
+def get_catalog_snapshot() -> dict:
+	return frappe.cache.get_value(CATALOG_SNAPSHOT_CACHE_KEY) or build_catalog_snapshot()
+
+
+### Item | Item Group | Item Price: on_update, on_trash
+def on_catalog_change(doc=None, method=None):
+	"""
+	Drops the per-language service cache and rebuilds the catalog snapshot in the
+	background. The previous snapshot keeps being served until the new one is ready.
+	"""
+	frappe.cache.delete_value(SERVICE_CATALOG_CACHE_KEY)
+
+	frappe.enqueue(
+		"salon.whatsapp.catalog.build_catalog_snapshot",
+		queue="short",
+		job_id="salon_catalog_snapshot",
+		deduplicate=True,
+		enqueue_after_commit=True,
+	)
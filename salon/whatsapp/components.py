@@ -0,0 +1,101 @@
+import frappe
+import hashlib
+import json
+from salon.whatsapp.templates import check_components, get_template_registry
+
+COMPILED_COMPONENTS_CACHE_KEY = "salon:compiled_components"
+COMPILED_COMPONENTS_TTL = 24 * 60 * 60
+
+SECTIONS = ("header", "body", "button")
+ROW_FIELDS = ("section_name", "param_order", "type", "sub_type", "text", "file_url", "file_name")
+
+
+def get_components_hash(template_name: str | None, rows: list) -> str:
+    """Hash of the template, its synced definition and the parameter rows."""
+    params = [[row.get(field) for field in ROW_FIELDS] for row in rows]
+    definition = get_template_registry().get(template_name) if template_name else None
+    body = json.dumps([template_name, definition, params], sort_keys=True, default=str, separators=(",", ":"))
+
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def compile_components(template_name: str | None, rows: list) -> list:
+    """
+    Builds the gateway `components` payload from Message Components Table rows already
+    loaded on the document, validated against the template. Compiled payloads are cached
+    by template and parameters, so resending the same template skips compilation.
+    """
+    key = f"{COMPILED_COMPONENTS_CACHE_KEY}:{get_components_hash(template_name, rows)}"
+
+    components = frappe.cache.get_value(key)
+    if components is None:
+        components = build_components(rows)
+        validate_components(template_name, components)
+        frappe.cache.set_value(key, components, expires_in_sec=COMPILED_COMPONENTS_TTL)
+
+    return components
+
+
+def build_components(rows: list) -> list:
+    """One pass over the rows: group by section, order by param_order, map to gateway params."""
+    sections = {section: [] for section in SECTIONS}
+
+    for row in sorted(rows, key=lambda row: row.get("param_order") or 0):
+        section = row.get("section_name")
+        if section not in sections:
+            frappe.throw(f"Row #{row.get('idx')}: unknown component section {section!r}")
+
+        param = build_param(section, row)
+        if param:
+            sections[section].append(param)
+
+    return [
+        {"section_name": section, "params": params}
+        for section, params in sections.items()
+        if params
+    ]
+
+
+def build_param(section: str, row) -> dict | None:
+    if section == "button":
+        if row.get("sub_type") == "url":
+            if not row.get("file_url"):
+                frappe.throw(f"Row #{row.get('idx')}: URL buttons need a File URL")
+
+            return {"type": "button", "sub_type": "url", "file_url": row.get("file_url")}
+
+        if not row.get("text"):
+            frappe.throw(f"Row #{row.get('idx')}: {row.get('sub_type') or 'code'} buttons need a Text")
+
+        # phone_number OR code
+        return {"type": "button", "sub_type": row.get("sub_type"), "text": row.get("text")}
+
+    if row.get("type") == "text":
+        if not row.get("text"):
+            frappe.throw(f"Row #{row.get('idx')}: text parameters need a Text")
+
+        return {"type": "text", "text": row.get("text")}
+
+    if row.get("type") == "document":
+        if not row.get("file_url"):
+            frappe.throw(f"Row #{row.get('idx')}: document parameters need a File URL")
+
+        return {"type": "document", "file_url": row.get("file_url"), "file_name": row.get("file_name")}
+
+    if row.get("type") == "image":
+        if not row.get("file_url"):
+            frappe.throw(f"Row #{row.get('idx')}: image parameters need a File URL")
+
+        return {"type": "image", "file_url": row.get("file_url")}
+
+    return None
+
+
+def validate_components(template_name: str | None, components: list):
+    """Checks the compiled payload against the template's synced definition before anything is sent."""
+    if not template_name:
+        return
+
+    error = check_components(template_name, components)
+    if error:
+        frappe.throw(error)
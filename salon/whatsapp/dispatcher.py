@@ -0,0 +1,186 @@
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from salon.whatsapp.gateway import (
+    INIT_BROADCAST_PATH,
+    SEND_INTERACTIVE_PATH,
+    SUBMIT_BROADCAST_PATH,
+    GatewayClient,
+    GatewayError,
+)
+
+## Calls that create something on the gateway: a retry after the request went out could duplicate it
+NON_IDEMPOTENT_PATHS = (INIT_BROADCAST_PATH, SEND_INTERACTIVE_PATH)
+
+
+def batch_reminder_messages(reminders: list, per_recipient_params: bool = False, batch_size: int = 100) -> list:
+    """
+    Groups single-recipient reminders into multi-recipient broadcasts.
+
+    `reminders` are dicts of {"key", "instance_id", "template_name", "number", "components"}.
+    Reminders are grouped by template and instance. When the gateway accepts per-recipient
+    parameters, each group is chunked into broadcasts of `batch_size` recipients that carry
+    a "recipients" list of {number, components}, and top-level components only when every
+    recipient has the same ones. Otherwise only reminders with identical components can
+    share a broadcast, and those groups are chunked the same way.
+
+    :return: dispatcher messages whose "key" is the list of reminder keys they carry
+    """
+    groups = {}
+    for reminder in reminders:
+        group = (reminder["template_name"], reminder["instance_id"])
+        if not per_recipient_params:
+            group += (json.dumps(reminder["components"], sort_keys=True, default=str),)
+
+        groups.setdefault(group, []).append(reminder)
+
+    messages = []
+    batch_size = max(int(batch_size), 1)
+    for (template_name, instance_id, *_), group in groups.items():
+        for i in range(0, len(group), batch_size):
+            chunk = group[i:i + batch_size]
+
+            payload = {
+                "instance_id": instance_id,
+                "message_type": "template",
+                "text": None,
+                "template_name": template_name,
+                "numbers": [reminder["number"] for reminder in chunk],
+            }
+
+            ## Top-level components go to every number, so only send them when the whole chunk shares them
+            if all(reminder["components"] == chunk[0]["components"] for reminder in chunk):
+                payload["components"] = chunk[0]["components"]
+
+            if per_recipient_params:
+                payload["recipients"] = [
+                    {"number": reminder["number"], "components": reminder["components"]}
+                    for reminder in chunk
+                ]
+
+            messages.append({
+                "key": [reminder["key"] for reminder in chunk],
+                "instance_id": instance_id,
+                "payload": payload,
+            })
+
+    return messages
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, with bursts of up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(rate, 1))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+class ReminderDispatcher:
+    """
+    Sends broadcast messages (init then submit) over a bounded thread pool.
+
+    Each WhatsApp instance gets its own token bucket, so a busy instance cannot
+    starve the others. Connection errors, 429 and 5xx responses are retried with
+    exponential backoff; anything else fails the message straight away. Calls that
+    create a broadcast are only retried when the gateway certainly never got them.
+
+    Requests go through a GatewayClient, so the pool shares its keep-alive
+    connections. Threads only do HTTP: messages are plain dicts of
+    {"key", "instance_id", "payload"} and `dispatch` returns one outcome dict per
+    message, so the caller records results from its own (database) thread.
+    """
+
+    def __init__(
+        self,
+        client: GatewayClient,
+        max_workers: int = 8,
+        rate_per_instance: float = 5.0,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+    ):
+        self.client = client
+        self.max_workers = max(int(max_workers), 1)
+        self.rate_per_instance = float(rate_per_instance)
+        self.max_retries = int(max_retries)
+        self.backoff = float(backoff)
+
+        self.buckets = {}
+        self.buckets_lock = threading.Lock()
+
+    def dispatch(self, messages: list) -> list:
+        if not messages:
+            return []
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(messages))) as executor:
+            return list(executor.map(self.send, messages))
+
+    def send(self, message: dict) -> dict:
+        outcome = {
+            "key": message["key"],
+            "success": False,
+            "reference_id": None,
+            "attempts": 0,
+            "error": None,
+        }
+
+        try:
+            data = self.post(INIT_BROADCAST_PATH, message["instance_id"], message["payload"], outcome)
+            outcome["reference_id"] = data.get("reference_id")
+
+            self.post(SUBMIT_BROADCAST_PATH, message["instance_id"], {"reference_id": outcome["reference_id"]}, outcome)
+            outcome["success"] = True
+
+        except GatewayError as e:
+            outcome["error"] = str(e)
+
+        except Exception as e:
+            ## Never let one message end the pool: the caller must record every outcome
+            outcome["error"] = f"{type(e).__name__}: {e}"
+
+        return outcome
+
+    def post(self, path: str, instance_id: str, payload: dict, outcome: dict) -> dict:
+        bucket = self.get_bucket(instance_id)
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(self.backoff * (2 ** (attempt - 1)) * (1 + random.random()))
+
+            bucket.acquire()
+            outcome["attempts"] += 1
+
+            try:
+                return self.client.post(path, payload)
+            except GatewayError as e:
+                if not e.retryable or attempt == self.max_retries:
+                    raise
+                if e.delivered and path in NON_IDEMPOTENT_PATHS:
+                    raise
+
+    def get_bucket(self, instance_id: str) -> TokenBucket:
+        with self.buckets_lock:
+            if instance_id not in self.buckets:
+                self.buckets[instance_id] = TokenBucket(self.rate_per_instance)
+
+            return self.buckets[instance_id]
@@ -0,0 +1,32 @@
+# Copyright (c) 2026, salon and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+
+class TestWhatsAppAudience(FrappeTestCase):
+	def test_conditions_follow_filters(self):
+		audience = frappe.get_doc({
+			"doctype": "WhatsApp Audience",
+			"audience_name": "_Test Lapsed Hair Customers",
+			"department": "Services",
+			"not_visited_after": "2026-01-01",
+			"min_deposit_balance": 100,
+		})
+		conditions, values = audience.get_conditions()
+
+		self.assertIn("NOT (EXISTS", conditions)
+		self.assertIn("c.deposit_balance >= %(min_deposit_balance)s", conditions)
+		self.assertNotIn("max_deposit_balance", conditions)
+		self.assertEqual(values["department"], "Services")
+		self.assertEqual(values["not_visited_after"], "2026-01-01")
+
+	def test_counts_recipients(self):
+		audience = frappe.get_doc({
+			"doctype": "WhatsApp Audience",
+			"audience_name": "_Test All Customers",
+		}).insert(ignore_if_duplicate=True)
+
+		count = audience.count_recipients()
+		self.assertEqual(count, len(list(audience.iter_numbers(page_size=2))))
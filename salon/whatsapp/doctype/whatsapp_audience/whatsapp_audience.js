@@ -0,0 +1,12 @@
+// Copyright (c) 2026, salon and contributors
+// For license information, please see license.txt
+
+frappe.ui.form.on("WhatsApp Audience", {
+	refresh(frm) {
+		if (frm.is_new()) return;
+
+		frm.add_custom_button(__("Count Recipients"), () => {
+			frm.call("count_recipients").then(() => frm.reload_doc());
+		});
+	},
+});
@@ -0,0 +1,106 @@
+# Copyright (c) 2026, salon and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import flt, now_datetime
+
+## Invoices that count as a visit, with their item child table
+VISIT_DOCTYPES = (("Sales Invoice", "Sales Invoice Item"), ("POS Invoice", "POS Invoice Item"))
+
+
+class WhatsAppAudience(Document):
+	"""
+	A saved customer query used as broadcast recipients. It is resolved at send time
+	in keyset pages over Customer, so the recipients are never stored as child rows.
+	"""
+	def validate(self):
+		if self.min_deposit_balance and self.max_deposit_balance and flt(self.min_deposit_balance) > flt(self.max_deposit_balance):
+			frappe.throw("Minimum Deposit Balance cannot be more than Maximum Deposit Balance")
+
+	@frappe.whitelist()
+	def count_recipients(self):
+		conditions, values = self.get_conditions()
+
+		count = frappe.db.sql(f"""
+			SELECT COUNT(*)
+			FROM `tabCustomer` AS c
+			WHERE {conditions}
+		""", values)[0][0]
+
+		self.db_set({"estimated_recipients": count, "counted_on": now_datetime()})
+		return count
+
+	def iter_numbers(self, page_size=5000):
+		"""Yields (position, mobile number) for every matching customer, one page of customers at a time."""
+		conditions, values = self.get_conditions()
+
+		last_name = ""
+		position = 0
+		while True:
+			customers = frappe.db.sql(f"""
+				SELECT
+					c.name,
+					IFNULL(c.canonical_mobile, c.mobile_no) AS number
+				FROM
+					`tabCustomer` AS c
+				WHERE
+					{conditions}
+					AND c.name > %(last_name)s
+				ORDER BY
+					c.name
+				LIMIT %(page_size)s
+			""", {**values, "last_name": last_name, "page_size": page_size}, as_dict=True)
+
+			if not customers:
+				return
+
+			for customer in customers:
+				position += 1
+				yield position, customer.number
+
+			last_name = customers[-1].name
+
+	def get_conditions(self):
+		conditions = ["c.disabled = 0", "IFNULL(c.mobile_no, '') != ''"]
+		values = {}
+
+		if self.department or self.visited_after:
+			conditions.append(self.get_visit_condition("visited_after", self.visited_after, values))
+
+		if self.not_visited_after:
+			conditions.append("NOT " + self.get_visit_condition("not_visited_after", self.not_visited_after, values))
+
+		if self.min_deposit_balance:
+			conditions.append("c.deposit_balance >= %(min_deposit_balance)s")
+			values["min_deposit_balance"] = flt(self.min_deposit_balance)
+
+		if self.max_deposit_balance:
+			conditions.append("c.deposit_balance <= %(max_deposit_balance)s")
+			values["max_deposit_balance"] = flt(self.max_deposit_balance)
+
+		return " AND ".join(conditions), values
+
+	def get_visit_condition(self, key, since, values):
+		"""
+		EXISTS over submitted invoices of the customer, optionally limited to the department's
+		items and to invoices posted on or after `since`. Uses the invoices' customer index.
+		"""
+		visits = []
+		for invoice, item in VISIT_DOCTYPES:
+			filters = ["inv.customer = c.name", "inv.docstatus = 1"]
+
+			if since:
+				filters.append(f"inv.posting_date >= %({key})s")
+				values[key] = since
+
+			if self.department:
+				filters.append(f"""EXISTS (
+					SELECT 1 FROM `tab{item}` AS item
+					WHERE item.parent = inv.name AND item.item_group = %(department)s
+				)""")
+				values["department"] = self.department
+
+			visits.append(f"EXISTS (SELECT 1 FROM `tab{invoice}` AS inv WHERE {' AND '.join(filters)})")
+
+		return f"({' OR '.join(visits)})"
@@ -0,0 +1,26 @@
+# Copyright (c) 2026, salon and Contributors
+# See license.txt
+
+# import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from salon.whatsapp.broadcast import iter_recipient_chunks
+
+
+class TestWhatsAppBroadcastChunk(FrappeTestCase):
+	def test_chunks_normalise_and_deduplicate_numbers(self):
+		rows = [(1, "0501234567"), (2, "+966 50 123 4567"), (3, "501234568"), (4, ""), (5, "00966501234569")]
+		chunks = list(iter_recipient_chunks(rows, chunk_size=2))
+
+		self.assertEqual([chunk["numbers"] for chunk in chunks], [["966501234567", "966501234568"], ["966501234569"]])
+		self.assertEqual([(chunk["first_idx"], chunk["last_idx"]) for chunk in chunks], [(1, 3), (4, 5)])
+		self.assertEqual([chunk["chunk_index"] for chunk in chunks], [0, 1])
+
+	def test_chunking_is_deterministic(self):
+		rows = [(i, f"05{i:08d}") for i in range(1, 2501)]
+
+		first = list(iter_recipient_chunks(rows, chunk_size=1000))
+		second = list(iter_recipient_chunks(iter(rows), chunk_size=1000))
+
+		self.assertEqual(first, second)
+		self.assertEqual([len(chunk["numbers"]) for chunk in first], [1000, 1000, 500])
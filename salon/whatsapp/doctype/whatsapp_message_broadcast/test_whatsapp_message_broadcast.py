@@ -1,9 +1,33 @@
 # Copyright (c) 2025, salon and Contributors
 # See license.txt
 
-# import frappe
+import frappe
 from frappe.tests.utils import FrappeTestCase
 
+from salon.whatsapp.components import build_components, get_components_hash
+
 
 class TestWhatsAppMessageBroadcast(FrappeTestCase):
-	pass
+	def test_components_are_built_in_one_pass(self):
+		rows = [
+			frappe._dict(idx=1, section_name="button", param_order=1, sub_type="code", text="SALE"),
+			frappe._dict(idx=2, section_name="body", param_order=2, type="text", text="*10:00*"),
+			frappe._dict(idx=3, section_name="header", param_order=1, type="document", file_url="/files/menu.pdf", file_name="menu.pdf"),
+			frappe._dict(idx=4, section_name="body", param_order=1, type="text", text="*Sara*"),
+		]
+
+		self.assertEqual(build_components(rows), [
+			{"section_name": "header", "params": [{"type": "document", "file_url": "/files/menu.pdf", "file_name": "menu.pdf"}]},
+			{"section_name": "body", "params": [{"type": "text", "text": "*Sara*"}, {"type": "text", "text": "*10:00*"}]},
+			{"section_name": "button", "params": [{"type": "button", "sub_type": "code", "text": "SALE"}]},
+		])
+
+	def test_invalid_rows_are_rejected(self):
+		rows = [frappe._dict(idx=1, section_name="body", param_order=1, type="text", text="")]
+		self.assertRaises(frappe.ValidationError, build_components, rows)
+
+	def test_hash_follows_template_and_params(self):
+		rows = [frappe._dict(section_name="body", param_order=1, type="text", text="*Sara*")]
+
+		self.assertEqual(get_components_hash("offer", rows), get_components_hash("offer", [dict(rows[0])]))
+		self.assertNotEqual(get_components_hash("offer", rows), get_components_hash("reminder", rows))
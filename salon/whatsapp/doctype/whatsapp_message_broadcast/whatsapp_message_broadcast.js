@@ -1,8 +1,24 @@
 // Copyright (c) 2025, salon and contributors
 // For license information, please see license.txt
 
-// frappe.ui.form.on("WhatsApp Message Broadcast", {
-// 	refresh(frm) {
+frappe.ui.form.on("WhatsApp Message Broadcast", {
+	setup(frm) {
+		frappe.realtime.on("whatsapp_broadcast_progress", (data) => {
+			if (data.name !== frm.doc.name) return;
 
-// 	},
-// });
+			frappe.show_alert({
+				message: data.message,
+				indicator: data.status === "Failed" ? "red" : "blue",
+			});
+			frm.reload_doc();
+		});
+	},
+
+	refresh(frm) {
+		if (frm.doc.status === "Failed") {
+			frm.add_custom_button(__("Retry"), () => {
+				frm.call("retry").then(() => frm.reload_doc());
+			});
+		}
+	},
+});
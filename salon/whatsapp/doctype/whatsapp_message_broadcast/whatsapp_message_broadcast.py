@@ -3,159 +3,165 @@
 
 import frappe
 from frappe.model.document import Document
-import requests
+from salon.whatsapp.broadcast import init_broadcast_chunks, submit_broadcast_chunks
+from salon.whatsapp.components import compile_components
 
 
 class WhatsAppMessageBroadcast(Document):
+	"""
+	Broadcasts are sent from background jobs so saving never waits on the gateway.
+	Status moves Queued -> Initialising -> Initialised (after_insert) and
+	Initialised -> Submitting -> Submitted (on_submit), or to Failed with the gateway
+	error. Each step starts by claiming its in-progress status under a row lock, so
+	duplicate jobs and retries never run a step twice, and the finished status is only
+	set once the gateway has accepted every chunk. Steps left in progress by a dead job
+	are resumed by salon.whatsapp.broadcast.resume_stalled_broadcasts.
+	Recipients are sent in WhatsApp Broadcast Chunks (see salon.whatsapp.broadcast),
+	and the broadcast's reference_id is the first chunk's.
+	"""
+	def validate(self):
+		self.build_components_dict()
+
 	def after_insert(self):
-		self.init_broadcast()
+		enqueue_broadcast_step(self.name, "init")
 
 	def on_submit(self):
-		self.submit_broadcast()
-
-	def init_broadcast(self):
-		wa_settings = frappe.get_doc("WhatsApp Settings", "WhatsApp Settings")
-		api_base_url = wa_settings.api_url
-		api_key = wa_settings.get_password("api_key")
-
-		wa_number = frappe.get_doc("WhatsApp Number", self.whatsapp_number)
-
-		instance_id = wa_number.instance_id
-		message_type = self.message_type
-		text = self.text
-		template_name = self.template
-		numbers = self.build_numbers_list()
-		components = self.build_components_dict()
-
-
-		url = f"{api_base_url}/whatsapp_integration.whatsapp_integration.doctype.whatsapp_broadcast_message.whatsapp_broadcast_message.init_broadcast"
-		request_body = {
-			"instance_id": instance_id,
-			"message_type": message_type,
-			"text": text,
-			"template_name": template_name,
-			"numbers": numbers,
-			"components": components,
-		}
-		headers = {
-			"Authorization": f"Basic {api_key}"
-		}
+		enqueue_broadcast_step(self.name, "submit")
 
-		response = requests.post(url, headers=headers, json=request_body)
-		if response.status_code == 200:
-			data = response.json()["message"]
+	def on_trash(self):
+		frappe.db.delete("WhatsApp Broadcast Chunk", {"broadcast": self.name})
 
-			success = data["success"]
-			if success:
-				reference_id = data["reference_id"]
-				message = data["message"]
+	def init_broadcast(self, resume=False):
+		if self.reference_id:
+			return
 
-				self.reference_id = reference_id
-				self.save()
-				frappe.msgprint(message)
-			
-			else:
-				error = data["error"]
-				frappe.throw(str(error))
+		if not (resume and self.status == "Initialising") and not self.claim_status("Queued", "Initialising"):
+			return
 
-		else:
-			frappe.throw(response.text)
-		
+		self.publish_progress("Initialising broadcast")
 
-			
+		errors = init_broadcast_chunks(self, self.build_request_body(), progress=self.publish_progress)
+		if errors:
+			self.set_failed("\n".join(errors))
+			return
 
+		first_chunk = frappe.db.get_value(
+			"WhatsApp Broadcast Chunk", {"broadcast": self.name, "chunk_index": 0}, "reference_id"
+		)
+		if not first_chunk:
+			self.set_failed("The broadcast has no valid numbers")
+			return
 
-	def submit_broadcast(self):
-		wa_settings = frappe.get_doc("WhatsApp Settings", "WhatsApp Settings")
-		api_base_url = wa_settings.api_url
-		api_key = wa_settings.get_password("api_key")
+		self.db_set({"reference_id": first_chunk, "status": "Initialised", "error": None})
 
-		url = f"{api_base_url}/whatsapp_integration.whatsapp_integration.doctype.whatsapp_broadcast_message.whatsapp_broadcast_message.submit_broadcast"
-		request_body = {
-			"reference_id": self.reference_id,
-		}
-		headers = {
-			"Authorization": f"Basic {api_key}"
-		}
+		## Lock the row so a concurrent desk submit either lands before this read
+		## (and is chained here) or after the commit (and its own job finds it Initialised)
+		docstatus = frappe.db.get_value(self.doctype, self.name, "docstatus", for_update=True)
+		frappe.db.commit()
+		self.publish_progress("Broadcast initialised")
+
+		if docstatus == 1:
+			self.submit_broadcast()
+
+
+	def submit_broadcast(self, resume=False):
+		"""Submits the initialised chunks. Resuming a Submitting broadcast submits the chunks left."""
+		if not (resume and self.status == "Submitting") and not self.claim_status("Initialised", "Submitting"):
+			return
+
+		self.publish_progress("Submitting broadcast")
+
+		errors = submit_broadcast_chunks(self, progress=self.publish_progress)
+		if errors:
+			self.set_failed("\n".join(errors))
+			return
+
+		self.db_set({"status": "Submitted", "error": None})
+		frappe.db.commit()
+		self.publish_progress("Sent")
+
+
+	@frappe.whitelist()
+	def retry(self):
+		"""Re-runs the step that failed. Does nothing unless the broadcast is Failed."""
+		self.check_permission("write")
+
+		if self.reference_id:
+			if self.docstatus == 1 and self.claim_status("Failed", "Initialised"):
+				enqueue_broadcast_step(self.name, "submit")
+
+		elif self.claim_status("Failed", "Queued"):
+			enqueue_broadcast_step(self.name, "init")
 
-		response = requests.post(url, headers=headers, json=request_body)
-		if response.status_code == 200:
-			data = response.json()["message"]
+		return frappe.db.get_value(self.doctype, self.name, "status")
 
-			success = data["success"]
-			if success:
-				frappe.msgprint("Sent")
-			
-			else:
-				error = data["error"]
-				frappe.throw(str(error))
-		else:
-			frappe.throw(response.text)
 
+	def claim_status(self, current, new):
+		"""Moves the status from `current` to `new` and commits, unless another job got there first."""
+		## The row lock makes concurrent claims wait and then read the winner's status
+		claimed = frappe.db.get_value(self.doctype, self.name, "status", for_update=True) == current
+		if claimed:
+			frappe.db.set_value(self.doctype, self.name, "status", new)
 
-	def build_numbers_list(self):
-		numbers = []
-		for row in self.numbers:
-			numbers.append(row.number)
+		frappe.db.commit()
 
-		return numbers
+		if claimed:
+			self.status = new
+
+		return claimed
+
+
+	def set_failed(self, error):
+		self.db_set({"status": "Failed", "error": str(error)})
+		frappe.db.commit()
+		self.publish_progress(str(error))
+
+
+	def publish_progress(self, message):
+		frappe.publish_realtime(
+			"whatsapp_broadcast_progress",
+			{"name": self.name, "status": self.status, "message": message},
+			doctype=self.doctype,
+			docname=self.name,
+		)
+
+
+	def build_request_body(self):
+		wa_number = frappe.get_cached_doc("WhatsApp Number", self.whatsapp_number)
+
+		return {
+			"instance_id": wa_number.instance_id,
+			"message_type": self.message_type,
+			"text": self.text,
+			"template_name": self.template,
+			"components": self.build_components_dict(),
+		}
 
 
 	def build_components_dict(self):
-		def get_params(broadcast_id, section):
-			return frappe.db.sql("""
-				SELECT c.section_name, c.param_order, c.type, c.sub_type, 
-					c.text, c.file_url, c.file_name
-				FROM `tabMessage Components Table` AS c
-				WHERE c.parent=%s AND c.section_name=%s
-				ORDER BY c.param_order
-			""", (broadcast_id, section), as_dict=True)
-
-		components = []
-
-		# Sections in order
-		sections = ["header", "body", "button"]
-
-		for section in sections:
-			rows = get_params(self.name, section)
-			params_list = []
-
-			for row in rows:
-				# HEADER / BODY handling
-				if section in ("header", "body"):
-					if row.type == "text":
-						params_list.append({
-							"type": "text",
-							"text": row.text
-						})
-					elif row.type == "document":
-						params_list.append({
-							"type": "document",
-							"file_url": row.file_url,
-							"file_name": row.file_name
-						})
-
-				# BUTTON handling
-				elif section == "button":
-					if row.sub_type == "url":
-						params_list.append({
-							"type": "button",
-							"sub_type": "url",
-							"file_url": row.file_url,
-							# "file_name": row.file_name
-						})
-					else:
-						# phone_number OR code
-						params_list.append({
-							"type": "button",
-							"sub_type": row.sub_type,
-							"text": row.text
-						})
-
-			if params_list:
-				components.append({
-					"section_name": section,
-					"params": params_list
-				})
-
-		return components
+		if self.message_type != "template":
+			return []
+
+		return compile_components(self.template, self.components)
+
+
+def enqueue_broadcast_step(broadcast, step, resume=False):
+	frappe.enqueue(
+		"salon.whatsapp.doctype.whatsapp_message_broadcast.whatsapp_message_broadcast.run_broadcast_step",
+		queue="short",
+		job_id=f"whatsapp_broadcast::{broadcast}::{step}",
+		deduplicate=True,
+		enqueue_after_commit=True,
+		broadcast=broadcast,
+		step=step,
+		resume=resume,
+	)
+
+
+def run_broadcast_step(broadcast, step, resume=False):
+	doc = frappe.get_doc("WhatsApp Message Broadcast", broadcast)
+
+	if step == "init":
+		doc.init_broadcast(resume=resume)
+	else:
+		doc.submit_broadcast(resume=resume)
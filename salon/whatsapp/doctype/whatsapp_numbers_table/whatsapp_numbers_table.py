@@ -1,9 +1,13 @@
 # Copyright (c) 2025, salon and contributors
 # For license information, please see license.txt
 
-# import frappe
+import frappe
 from frappe.model.document import Document
 
 
 class WhatsAppNumbersTable(Document):
 	pass
+
+
+def on_doctype_update():
+	frappe.db.add_index("WhatsApp Numbers Table", ["parent", "idx"])
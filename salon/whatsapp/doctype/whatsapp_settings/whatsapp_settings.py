@@ -3,7 +3,9 @@
 
 # import frappe
 from frappe.model.document import Document
+from salon.whatsapp.gateway import clear_gateway_config
 
 
 class WhatsAppSettings(Document):
-	pass
+	def on_update(self):
+		clear_gateway_config()
@@ -1,9 +1,58 @@
 # Copyright (c) 2025, salon and Contributors
 # See license.txt
 
-# import frappe
+from unittest.mock import patch
+
 from frappe.tests.utils import FrappeTestCase
 
+from salon.whatsapp.templates import check_components, compact_definition
+
+REMINDER_DEFINITION = {
+	"name": "appointment_reminder",
+	"language": "ar",
+	"status": "APPROVED",
+	"components": [
+		{"type": "HEADER", "format": "DOCUMENT"},
+		{"type": "BODY", "text": "مرحبا {{1}}، موعدك {{2}}"},
+		{"type": "BUTTONS", "buttons": [
+			{"type": "URL", "url": "https://example.com/{{1}}"},
+			{"type": "PHONE_NUMBER", "phone_number": "+966500000000"},
+		]},
+	],
+}
+
 
 class TestWhatsAppTemplate(FrappeTestCase):
-	pass
+	def test_definition_is_compacted(self):
+		self.assertEqual(compact_definition(REMINDER_DEFINITION), {
+			"header_format": "DOCUMENT",
+			"header_params": 1,
+			"body_params": 2,
+			"buttons": ["url"],
+			"phone_buttons": 1,
+		})
+
+	def test_components_are_checked_locally(self):
+		registry = {"appointment_reminder": {"status": "APPROVED", **compact_definition(REMINDER_DEFINITION)}}
+		components = [
+			{"section_name": "header", "params": [{"type": "document", "file_url": "/files/a.pdf", "file_name": "a.pdf"}]},
+			{"section_name": "body", "params": [{"type": "text", "text": "*Sara*"}, {"type": "text", "text": "*10:00*"}]},
+			{"section_name": "button", "params": [{"type": "button", "sub_type": "url", "file_url": "abc"}]},
+		]
+
+		with patch("salon.whatsapp.templates.get_template_registry", return_value=registry):
+			self.assertIsNone(check_components("appointment_reminder", components))
+
+			## Phone number buttons accept a parameter without needing one
+			components[2]["params"].append({"type": "button", "sub_type": "phone_number", "text": "+966500000001"})
+			self.assertIsNone(check_components("appointment_reminder", components))
+
+			components[2]["params"].append({"type": "button", "sub_type": "phone_number", "text": "+966500000002"})
+			self.assertIn("1 phone number button(s), got 2", check_components("appointment_reminder", components))
+			components[2]["params"].pop()
+
+			components[1]["params"].pop()
+			self.assertIn("2 body parameter(s), got 1", check_components("appointment_reminder", components))
+
+			registry["appointment_reminder"]["status"] = "REJECTED"
+			self.assertIn("REJECTED", check_components("appointment_reminder", components))
@@ -1,8 +1,12 @@
 // Copyright (c) 2025, salon and contributors
 // For license information, please see license.txt
 
-// frappe.ui.form.on("WhatsApp Template", {
-// 	refresh(frm) {
-
-// 	},
-// });
+frappe.ui.form.on("WhatsApp Template", {
+	refresh(frm) {
+		frm.add_custom_button(__("Sync from Gateway"), () => {
+			frappe.call("salon.whatsapp.templates.enqueue_template_sync").then(() => {
+				frappe.show_alert({ message: __("Template sync queued"), indicator: "blue" });
+			});
+		});
+	},
+});
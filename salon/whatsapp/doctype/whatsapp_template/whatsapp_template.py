@@ -3,7 +3,12 @@
 
 # import frappe
 from frappe.model.document import Document
+from salon.whatsapp.templates import clear_template_registry
 
 
 class WhatsAppTemplate(Document):
-	pass
+	def on_update(self):
+		clear_template_registry()
+
+	def on_trash(self):
+		clear_template_registry()
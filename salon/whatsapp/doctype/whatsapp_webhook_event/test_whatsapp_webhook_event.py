@@ -0,0 +1,63 @@
+# Copyright (c) 2026, salon and Contributors
+# See license.txt
+
+import json
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from salon.whatsapp.inbox import get_event_type, get_message_id, parse_review_reply, store_webhook_event
+
+
+def make_reply(row_id, message_id="wamid.TEST-1"):
+	return {
+		"id": message_id,
+		"interactive": {
+			"type": "list_reply",
+			"list_reply": {"id": row_id, "title": "Excellent", "description": "Great service"},
+		},
+	}
+
+
+class TestWhatsAppWebhookEvent(FrappeTestCase):
+	def test_review_reply_is_parsed(self):
+		self.assertEqual(
+			parse_review_reply(make_reply("SR-0001_5")),
+			{"review_id": "SR-0001", "rating": 5.0, "description": "Great service"},
+		)
+		self.assertIsNone(parse_review_reply({"type": "text", "text": {"body": "hi"}}))
+		self.assertRaises(ValueError, parse_review_reply, make_reply("SR-0001_9"))
+
+	def test_message_id_falls_back_to_body_hash(self):
+		self.assertEqual(get_message_id(make_reply("SR-0001_5"), ""), "wamid.TEST-1")
+
+		raw = json.dumps({"type": "status"})
+		self.assertEqual(get_message_id(json.loads(raw), raw), get_message_id(json.loads(raw), raw))
+
+	def test_redeliveries_are_stored_once(self):
+		raw = json.dumps(make_reply("SR-0001_5", message_id="wamid.TEST-REDELIVERY"))
+
+		self.assertTrue(store_webhook_event(raw))
+		self.assertTrue(store_webhook_event(raw))
+		self.assertFalse(store_webhook_event("not json"))
+
+		self.assertEqual(
+			frappe.db.count("WhatsApp Webhook Event", {"message_id": "wamid.TEST-REDELIVERY"}), 1
+		)
+
+	def test_malformed_fields_are_stored(self):
+		raw = json.dumps({"message": "wamid.TEST-STRING", "type": {"name": "text"}})
+		data = json.loads(raw)
+
+		self.assertEqual(get_event_type(data), "unknown")
+		self.assertEqual(get_message_id(data, raw), get_message_id(json.loads(raw), raw))
+		self.assertEqual(get_message_id({"message": ["wamid.TEST-LIST"]}, raw), get_message_id(data, raw))
+		self.assertEqual(len(get_message_id({"id": "x" * 500}, raw)), 64)
+
+		self.assertTrue(store_webhook_event(raw))
+		self.assertEqual(
+			frappe.db.count("WhatsApp Webhook Event", {"message_id": get_message_id(data, raw)}), 1
+		)
+		self.assertIsNone(
+			parse_review_reply({"interactive": {"type": "list_reply", "list_reply": "SR-0001_5"}})
+		)
@@ -0,0 +1,100 @@
+"""
+A local stand-in for the WhatsApp integration gateway, for tests and throughput
+benchmarks. It answers init_broadcast/submit_broadcast the way the real gateway
+does, with optional latency and a share of failed responses (503 by default) to
+exercise retries.
+"""
+import json
+import random
+import socket
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeGateway:
+    def __init__(
+        self,
+        latency: float = 0.0,
+        failure_rate: float = 0.0,
+        failure_status: int = 503,
+        reply_body: dict | None = None,
+    ):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.reply_body = reply_body
+        self.requests = []
+        self.connections = 0
+        self.lock = threading.Lock()
+
+        gateway = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                # Keep-alive replies go out as two writes; don't let Nagle hold the second one back
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+                with gateway.lock:
+                    gateway.connections += 1
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                method = self.path.rsplit(".", 1)[-1]
+
+                with gateway.lock:
+                    gateway.requests.append({"method": method, "body": body})
+
+                if gateway.latency:
+                    time.sleep(gateway.latency)
+
+                if gateway.reply_body is not None:
+                    self.reply(200, gateway.reply_body)
+                elif random.random() < gateway.failure_rate:
+                    self.reply(gateway.failure_status, {"message": {"success": False, "error": "Service Unavailable"}})
+                elif method == "init_broadcast":
+                    self.reply(200, {"message": {
+                        "success": True,
+                        "reference_id": uuid.uuid4().hex,
+                        "message": "Broadcast initialised",
+                    }})
+                elif method == "submit_broadcast":
+                    self.reply(200, {"message": {"success": True}})
+                else:
+                    self.reply(404, {"message": {"success": False, "error": f"Unknown method {method}"}})
+
+            def reply(self, status: int, data: dict):
+                body = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address
+        return f"http://{host}:{port}/api/method"
+
+    def count(self, method: str) -> int:
+        with self.lock:
+            return sum(1 for request in self.requests if request["method"] == method)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
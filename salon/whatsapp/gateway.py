@@ -0,0 +1,263 @@
+import frappe
+import threading
+from time import perf_counter
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+INIT_BROADCAST_PATH = "whatsapp_integration.whatsapp_integration.doctype.whatsapp_broadcast_message.whatsapp_broadcast_message.init_broadcast"
+SUBMIT_BROADCAST_PATH = "whatsapp_integration.whatsapp_integration.doctype.whatsapp_broadcast_message.whatsapp_broadcast_message.submit_broadcast"
+SEND_INTERACTIVE_PATH = "whatsapp_integration.whatsapp_integration.doctype.whatsapp_message.whatsapp_message.send_interactive"
+
+LATENCY_METRICS_KEY = "salon:gateway_latency"
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 15
+
+## One keep-alive session per worker process, shared by every thread
+_session = None
+_session_lock = threading.Lock()
+
+## Gateway settings per site, memoised by the WhatsApp Settings modified timestamp
+_configs = {}
+
+
+class GatewayError(Exception):
+    """
+    `retryable` marks transient failures. `delivered` is False only when the gateway
+    certainly did not act on the request (no connection, or 429), which is the only
+    case where a non-idempotent call may be retried.
+    """
+    def __init__(self, message: str, retryable: bool = False, delivered: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+        self.delivered = delivered
+
+
+def is_connect_error(error: requests.RequestException) -> bool:
+    """True when the request never reached the gateway: the connection itself failed."""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(error, requests.ConnectionError) and isinstance(reason, NewConnectionError)
+
+
+class LatencyHistogram:
+    """
+    Per-endpoint request latencies bucketed in milliseconds, kept in process memory
+    so gateway threads can record without touching Redis. `drain` hands the counts
+    over to `flush_latency_metrics` and starts again from zero.
+    """
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def observe(self, endpoint: str, seconds: float):
+        elapsed_ms = seconds * 1000
+        bucket = next((f"le_{le}" for le in self.buckets if elapsed_ms <= le), "le_inf")
+
+        with self.lock:
+            for field, amount in (
+                (f"{endpoint}|{bucket}", 1),
+                (f"{endpoint}|count", 1),
+                (f"{endpoint}|sum_ms", round(elapsed_ms)),
+            ):
+                self.counts[field] = self.counts.get(field, 0) + amount
+
+    def drain(self) -> dict:
+        with self.lock:
+            counts, self.counts = self.counts, {}
+
+        return counts
+
+
+latency_histogram = LatencyHistogram()
+
+
+class GatewayClient:
+    """
+    Posts to the WhatsApp integration gateway over a pooled keep-alive session,
+    raising GatewayError for failures. Connection errors, 429 and 5xx responses
+    are marked retryable. Every call is timed into the latency histogram.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        session: requests.Session | None = None,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: float = DEFAULT_READ_TIMEOUT,
+        histogram: LatencyHistogram | None = latency_histogram,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.headers = {"Authorization": f"Basic {api_key}"}
+        self.session = session or requests.Session()
+        self.timeout = (connect_timeout, read_timeout)
+        self.histogram = histogram
+
+    def post(self, path: str, payload: dict) -> dict:
+        started = perf_counter()
+        try:
+            response = self.session.post(
+                f"{self.base_url}/{path}", headers=self.headers, json=payload, timeout=self.timeout
+            )
+        except requests.RequestException as e:
+            raise GatewayError(str(e), retryable=True, delivered=not is_connect_error(e))
+        finally:
+            if self.histogram:
+                self.histogram.observe(path.rsplit(".", 1)[-1], perf_counter() - started)
+
+        if response.status_code == 429:
+            raise GatewayError(f"{response.status_code}: {response.text}", retryable=True, delivered=False)
+
+        if response.status_code >= 500:
+            raise GatewayError(f"{response.status_code}: {response.text}", retryable=True)
+
+        if response.status_code != 200:
+            raise GatewayError(f"{response.status_code}: {response.text}")
+
+        try:
+            data = response.json()["message"]
+        except (ValueError, KeyError, TypeError):
+            raise GatewayError(f"Unexpected gateway response: {response.text[:500]}")
+
+        if not isinstance(data, dict) or not data.get("success"):
+            error = data.get("error") if isinstance(data, dict) else data
+            raise GatewayError(str(error or data))
+
+        return data
+
+    def init_broadcast(self, payload: dict) -> dict:
+        return self.post(INIT_BROADCAST_PATH, payload)
+
+    def submit_broadcast(self, reference_id: str) -> dict:
+        return self.post(SUBMIT_BROADCAST_PATH, {"reference_id": reference_id})
+
+
+def get_session(pool_size: int = DEFAULT_POOL_SIZE) -> requests.Session:
+    """
+    The process-wide gateway session. Its connection pool keeps up to `pool_size`
+    connections alive, so repeated calls skip the TCP and TLS handshakes.
+    """
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(int(pool_size), 1))
+            _session = requests.Session()
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+
+        return _session
+
+
+def get_gateway_config() -> frappe._dict:
+    """
+    Gateway URL, API key and connection settings from the cached WhatsApp Settings.
+    The decrypted key is only read again after the settings are saved.
+    """
+    settings = frappe.get_cached_doc("WhatsApp Settings")
+    site = frappe.local.site
+
+    memo = _configs.get(site)
+    if memo and memo[0] == settings.modified:
+        return memo[1]
+
+    config = frappe._dict({
+        "api_url": settings.api_url,
+        "api_key": settings.get_password("api_key"),
+        "connect_timeout": settings.connect_timeout or DEFAULT_CONNECT_TIMEOUT,
+        "read_timeout": settings.read_timeout or DEFAULT_READ_TIMEOUT,
+        "pool_size": settings.pool_size or DEFAULT_POOL_SIZE,
+    })
+    _configs[site] = (settings.modified, config)
+
+    return config
+
+
+def clear_gateway_config():
+    _configs.pop(frappe.local.site, None)
+
+
+def get_gateway_client() -> GatewayClient:
+    config = get_gateway_config()
+
+    return GatewayClient(
+        config.api_url,
+        config.api_key,
+        session=get_session(config.pool_size),
+        connect_timeout=config.connect_timeout,
+        read_timeout=config.read_timeout,
+    )
+
+
+def flush_latency_metrics(*args, **kwargs):
+    """
+    Adds the latencies recorded by this process to the site's Redis histogram.
+    Runs after every request and background job, and is a no-op when nothing was recorded.
+    """
+    counts = latency_histogram.drain()
+    if not counts:
+        return
+
+    key = frappe.cache.make_key(LATENCY_METRICS_KEY)
+    pipeline = frappe.cache.pipeline()
+    for field, amount in counts.items():
+        pipeline.hincrby(key, field, amount)
+    pipeline.execute()
+
+
+@frappe.whitelist()
+def get_gateway_latency_metrics():
+    """
+    Per-endpoint call count, average latency and cumulative histogram of gateway
+    calls since the last reset. Quantiles are the upper bound of their bucket.
+    """
+    frappe.only_for("System Manager")
+
+    flush_latency_metrics()
+    raw = frappe.cache.execute_command("HGETALL", frappe.cache.make_key(LATENCY_METRICS_KEY)) or {}
+
+    endpoints = {}
+    for field, value in raw.items():
+        endpoint, name = frappe.safe_decode(field).split("|", 1)
+        endpoints.setdefault(endpoint, {})[name] = int(value)
+
+    metrics = {}
+    for endpoint, values in endpoints.items():
+        count = values.get("count", 0)
+
+        histogram = {}
+        cumulative = 0
+        for le in (*LATENCY_BUCKETS_MS, "inf"):
+            cumulative += values.get(f"le_{le}", 0)
+            histogram[str(le)] = cumulative
+
+        def quantile(q):
+            return next((le for le, total in histogram.items() if count and total >= q * count), None)
+
+        metrics[endpoint] = {
+            "count": count,
+            "avg_ms": round(values.get("sum_ms", 0) / count, 1) if count else None,
+            "p50_ms": quantile(0.5),
+            "p95_ms": quantile(0.95),
+            "p99_ms": quantile(0.99),
+            "histogram": histogram,
+        }
+
+    return metrics
+
+
+@frappe.whitelist()
+def reset_gateway_latency_metrics():
+    frappe.only_for("System Manager")
+
+    latency_histogram.drain()
+    frappe.cache.execute_command("DEL", frappe.cache.make_key(LATENCY_METRICS_KEY))
@@ -0,0 +1,253 @@
+import hashlib
+import json
+
+import frappe
+from frappe.utils import now_datetime
+
+WEBHOOK_BATCH_SIZE = 200
+MAX_EVENT_ATTEMPTS = 5
+## Length of the Data columns message_id and event_type
+MAX_DATA_LENGTH = 140
+
+RATINGS = {
+	1.0: 0.2,
+	2.0: 0.4,
+	3.0: 0.6,
+	4.0: 0.8,
+	5.0: 1.0,
+}
+
+
+def get_scalar(value) -> str | None:
+	"""The value as a string when the gateway sent a string or a number, else None."""
+	if isinstance(value, str | int) and not isinstance(value, bool):
+		return str(value) or None
+
+	return None
+
+
+def get_message_id(data: dict, raw_data: str) -> str:
+	"""
+	The gateway's message ID, or a hash of the body so identical redeliveries still
+	collapse. IDs too long for the column are hashed, so they stay unique.
+	"""
+	message = data.get("message")
+	for value in (
+		data.get("id"),
+		data.get("message_id"),
+		message.get("id") if isinstance(message, dict) else None,
+	):
+		message_id = get_scalar(value)
+		if message_id:
+			return message_id if len(message_id) <= MAX_DATA_LENGTH else sha256(message_id)
+
+	return sha256(raw_data)
+
+
+def get_event_type(data: dict) -> str:
+	interactive = data.get("interactive")
+	if isinstance(interactive, dict):
+		event_type = get_scalar(interactive.get("type")) or "interactive"
+	else:
+		event_type = get_scalar(data.get("type")) or "unknown"
+
+	return event_type[:MAX_DATA_LENGTH]
+
+
+def sha256(value: str) -> str:
+	return hashlib.sha256(value.encode()).hexdigest()
+
+
+def store_webhook_event(raw_data: str) -> bool:
+	"""
+	Appends the raw event to the inbox and queues processing after commit.
+	Redeliveries of a message already in the inbox are dropped by the unique message ID.
+
+	:return: False when the body is not a JSON object
+	"""
+	try:
+		data = json.loads(raw_data)
+	except ValueError:
+		return False
+
+	if not isinstance(data, dict):
+		return False
+
+	now = now_datetime()
+	frappe.db.bulk_insert(
+		"WhatsApp Webhook Event",
+		fields=[
+			"name",
+			"creation",
+			"modified",
+			"owner",
+			"modified_by",
+			"message_id",
+			"event_type",
+			"status",
+			"payload",
+		],
+		values=[
+			(
+				frappe.generate_hash(length=10),
+				now,
+				now,
+				frappe.session.user,
+				frappe.session.user,
+				get_message_id(data, raw_data),
+				get_event_type(data),
+				"Pending",
+				raw_data,
+			)
+		],
+		ignore_duplicates=True,
+	)
+
+	frappe.enqueue(
+		"salon.whatsapp.inbox.process_webhook_events",
+		queue="short",
+		job_id="salon_whatsapp_webhook_events",
+		deduplicate=True,
+		enqueue_after_commit=True,
+	)
+
+	return True
+
+
+def process_webhook_events(batch_size: int = WEBHOOK_BATCH_SIZE):
+	"""
+	Drains the inbox oldest first, one batch per transaction. Rows are claimed with
+	SKIP LOCKED so several workers can share a backlog without waiting on each other.
+	Also runs from the scheduler to pick up events whose job was lost.
+	"""
+	while True:
+		events = frappe.db.sql(
+			"""
+            SELECT
+                name,
+                payload,
+                attempts
+            FROM
+                `tabWhatsApp Webhook Event`
+            WHERE
+                status = 'Pending'
+            ORDER BY
+                creation
+            LIMIT %(batch_size)s
+            FOR UPDATE SKIP LOCKED
+        """,
+			{"batch_size": batch_size},
+			as_dict=True,
+		)
+
+		if not events:
+			return
+
+		process_event_batch(events)
+		frappe.db.commit()
+
+		if len(events) < batch_size:
+			return
+
+
+def process_event_batch(events: list):
+	replies = {}
+	results = {}
+
+	for event in events:
+		try:
+			reply = parse_review_reply(json.loads(event.payload))
+		except Exception as e:
+			results[event.name] = ("Failed", None, str(e))
+			continue
+
+		if reply:
+			replies[event.name] = reply
+		else:
+			results[event.name] = ("Ignored", None, None)
+
+	## One lookup for every review answered in the batch
+	review_ids = {reply["review_id"] for reply in replies.values()}
+	pending = (
+		set(
+			frappe.get_all(
+				"Service Review",
+				filters={"name": ["in", list(review_ids)], "status": "Pending"},
+				pluck="name",
+			)
+		)
+		if review_ids
+		else set()
+	)
+
+	for event_name, reply in replies.items():
+		review_id = reply["review_id"]
+		if review_id not in pending:
+			results[event_name] = ("Ignored", review_id, None)
+			continue
+
+		frappe.db.savepoint("webhook_event")
+		try:
+			review = frappe.get_doc("Service Review", review_id)
+			review.rating = RATINGS[reply["rating"]]
+			review.rating_number = int(reply["rating"])
+			review.description = reply["description"]
+			review.status = "Reviewed"
+			review.save(ignore_permissions=True)
+
+			## A second reply to the same review in this batch is ignored
+			pending.discard(review_id)
+			results[event_name] = ("Processed", review_id, None)
+
+		except Exception as e:
+			frappe.db.rollback(save_point="webhook_event")
+			results[event_name] = ("Failed", review_id, str(e))
+
+	save_event_results(events, results)
+
+
+def parse_review_reply(data: dict) -> dict | None:
+	"""
+	The review answer in a list_reply event, whose row id is "{review_id}_{rating}".
+	Returns None for events that are not review replies.
+	"""
+	interactive = data.get("interactive")
+	if not isinstance(interactive, dict) or interactive.get("type") != "list_reply":
+		return None
+
+	reply = interactive.get("list_reply")
+	if not isinstance(reply, dict) or not isinstance(reply.get("id"), str):
+		return None
+
+	review_id, _, rating = reply["id"].rpartition("_")
+	if not review_id:
+		return None
+
+	rating = float(rating)
+	if rating not in RATINGS:
+		raise ValueError(f"Unknown rating {rating}")
+
+	return {"review_id": review_id, "rating": rating, "description": reply.get("description")}
+
+
+def save_event_results(events: list, results: dict):
+	now = now_datetime()
+	attempts = {event.name: event.attempts or 0 for event in events}
+
+	for name, (status, reference_name, error) in results.items():
+		## Failures are retried with the next batches until they run out of attempts
+		if status == "Failed" and attempts[name] + 1 < MAX_EVENT_ATTEMPTS:
+			status = "Pending"
+
+		frappe.db.set_value(
+			"WhatsApp Webhook Event",
+			name,
+			{
+				"status": status,
+				"reference_name": reference_name,
+				"error": error,
+				"attempts": attempts[name] + 1,
+				"processed_on": now if status != "Pending" else None,
+			},
+			update_modified=False,
+		)
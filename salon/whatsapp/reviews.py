@@ -0,0 +1,231 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import frappe
+from frappe import _, _lt
+from frappe.model.naming import set_new_name
+from frappe.utils import now_datetime
+
+from salon.whatsapp.broadcast import call_gateway, get_chunk_dispatcher
+from salon.whatsapp.gateway import SEND_INTERACTIVE_PATH, flush_latency_metrics
+
+REVIEW_REQUEST_BATCH_SIZE = 200
+
+RATING_ROWS = (
+	(5, "⭐⭐⭐⭐⭐", _lt("Excellent")),
+	(4, "⭐⭐⭐⭐", _lt("Very good")),
+	(3, "⭐⭐⭐", _lt("Good")),
+	(2, "⭐⭐", _lt("Fair")),
+	(1, "⭐", _lt("Poor")),
+)
+
+
+def create_service_reviews(cart) -> list:
+	"""
+	Creates a Pending Service Review for every service of the cart in one INSERT and
+	queues the rating requests. Names follow the doctype's own naming rule.
+	"""
+	now = now_datetime()
+	values = []
+	for service in cart.services:
+		review = frappe.new_doc("Service Review")
+		review.update(
+			{
+				"order_id": cart.name,
+				"service": service.service,
+				"employee": service.employee,
+				"status": "Pending",
+			}
+		)
+		## Named after the fields are set, so field-based naming rules see them
+		set_new_name(review)
+		values.append(
+			(
+				review.name,
+				now,
+				now,
+				frappe.session.user,
+				frappe.session.user,
+				cart.name,
+				service.service,
+				service.employee,
+				"Pending",
+			)
+		)
+
+	if not values:
+		return []
+
+	frappe.db.bulk_insert(
+		"Service Review",
+		fields=[
+			"name",
+			"creation",
+			"modified",
+			"owner",
+			"modified_by",
+			"order_id",
+			"service",
+			"employee",
+			"status",
+		],
+		values=values,
+	)
+
+	enqueue_review_requests()
+
+	return [row[0] for row in values]
+
+
+def enqueue_review_requests():
+	"""One queued job sends the requests of every cart submitted until it starts."""
+	frappe.enqueue(
+		"salon.whatsapp.reviews.send_review_requests",
+		queue="short",
+		job_id="salon_review_requests",
+		deduplicate=True,
+		enqueue_after_commit=True,
+	)
+
+
+def build_review_request(review, number: str, instance_id: str) -> dict:
+	"""
+	An interactive list message with one row per rating. Row ids are "{review}_{rating}",
+	so the webhook resolves a reply to its review by primary key.
+	"""
+	service = review.service_name or review.service
+	employee = review.employee_name or review.employee
+
+	return {
+		"instance_id": instance_id,
+		"number": number,
+		"interactive": {
+			"type": "list",
+			"body": {
+				"text": _("Hello {0}, how was your {1} with {2}?").format(
+					review.customer_name, service, employee
+				)
+			},
+			"action": {
+				"button": _("Rate"),
+				"sections": [
+					{
+						"title": service[:24],
+						"rows": [
+							{"id": f"{review.name}_{rating}", "title": stars, "description": str(label)}
+							for rating, stars, label in RATING_ROWS
+						],
+					}
+				],
+			},
+		},
+	}
+
+
+def send_review_requests(batch_size: int = REVIEW_REQUEST_BATCH_SIZE):
+	"""
+	Sends the rating request of every Pending Service Review not asked yet, a batch at a
+	time over the gateway's per-instance rate limit, and stamps the reviews that went out
+	or can never go out (no customer number). Reviews created while the job runs would be
+	dropped by the job's deduplication, so the scan starts over until a pass finds
+	nothing new; reviews whose send failed are left for the next run.
+	"""
+	settings = frappe.get_cached_doc("WhatsApp Settings")
+	if not settings.default_review_number:
+		frappe.log_error(
+			title="Review Requests Skipped",
+			message="Set a Default Review Number in WhatsApp Settings to send review requests",
+		)
+		return
+
+	instance_id = frappe.get_cached_doc("WhatsApp Number", settings.default_review_number).instance_id
+	dispatcher = get_chunk_dispatcher()
+
+	failed = set()
+	while send_review_request_pass(dispatcher, instance_id, failed, batch_size):
+		pass
+
+	flush_latency_metrics()
+
+
+def send_review_request_pass(dispatcher, instance_id: str, failed: set, batch_size: int) -> int:
+	"""One keyset scan over the unrequested reviews. Returns how many were stamped."""
+	stamped = 0
+	last_name = ""
+	while True:
+		reviews = frappe.db.sql(
+			"""
+            SELECT
+                r.name,
+                r.service,
+                r.employee,
+                item.item_name AS service_name,
+                emp.employee_name,
+                cust.customer_name,
+                IFNULL(cust.canonical_mobile, cust.mobile_no) AS number
+            FROM
+                `tabService Review` AS r
+            LEFT JOIN
+                `tabCustomer Cart` AS cart ON cart.name = r.order_id
+            LEFT JOIN
+                `tabCustomer` AS cust ON cust.name = cart.customer
+            LEFT JOIN
+                `tabItem` AS item ON item.name = r.service
+            LEFT JOIN
+                `tabEmployee` AS emp ON emp.name = r.employee
+            WHERE
+                r.status = 'Pending'
+                AND r.review_requested_on IS NULL
+                AND r.name > %(last_name)s
+            ORDER BY
+                r.name
+            LIMIT %(batch_size)s
+        """,
+			{"last_name": last_name, "batch_size": batch_size},
+			as_dict=True,
+		)
+
+		if not reviews:
+			return stamped
+
+		last_name = reviews[-1].name
+		reviews = [review for review in reviews if review.name not in failed]
+
+		sendable = [review for review in reviews if review.number]
+		outcomes = []
+		if sendable:
+			with ThreadPoolExecutor(max_workers=min(dispatcher.max_workers, len(sendable))) as executor:
+				outcomes = list(
+					executor.map(
+						lambda review: call_gateway(
+							dispatcher,
+							SEND_INTERACTIVE_PATH,
+							instance_id,
+							build_review_request(review, review.number, instance_id),
+						),
+						sendable,
+					)
+				)
+
+		for review, outcome in zip(sendable, outcomes, strict=True):
+			if outcome["error"]:
+				failed.add(review.name)
+				frappe.log_error(
+					title="Review Request Failed",
+					message=outcome["error"],
+					reference_doctype="Service Review",
+					reference_name=review.name,
+				)
+
+		## Sent, or without a number to send to: either way never scanned again
+		done = [review.name for review in reviews if review.name not in failed]
+		if done:
+			frappe.db.sql(
+				"""
+                UPDATE `tabService Review`
+                SET review_requested_on = %(now)s
+                WHERE name IN %(names)s
+            """,
+				{"now": now_datetime(), "names": tuple(done)},
+			)
+			stamped += len(done)
+		frappe.db.commit()
@@ -0,0 +1,193 @@
+import frappe
+import json
+import re
+from frappe.utils import now_datetime
+from salon.whatsapp.gateway import GatewayError, get_gateway_client
+
+TEMPLATES_PATH = "whatsapp_integration.whatsapp_integration.doctype.whatsapp_template.whatsapp_template.get_templates"
+TEMPLATE_REGISTRY_CACHE_KEY = "salon:whatsapp_template_registry"
+
+MEDIA_FORMATS = ("IMAGE", "DOCUMENT", "VIDEO")
+PLACEHOLDER = re.compile(r"\{\{\s*\w+\s*\}\}")
+
+
+def count_params(text: str | None) -> int:
+    return len(PLACEHOLDER.findall(text or ""))
+
+
+def compact_definition(template: dict) -> dict:
+    """
+    Reduces a gateway (Meta format) template definition to what payload validation needs:
+    header format and parameter count, body parameter count, the buttons that take a parameter,
+    and the number of phone number buttons (which may be sent a parameter but need none).
+    """
+    compact = {"header_format": None, "header_params": 0, "body_params": 0, "buttons": [], "phone_buttons": 0}
+
+    for component in template.get("components") or []:
+        component_type = (component.get("type") or "").upper()
+
+        if component_type == "HEADER":
+            compact["header_format"] = (component.get("format") or "TEXT").upper()
+            compact["header_params"] = (
+                1 if compact["header_format"] in MEDIA_FORMATS else count_params(component.get("text"))
+            )
+
+        elif component_type == "BODY":
+            compact["body_params"] = count_params(component.get("text"))
+
+        elif component_type in ("BUTTONS", "BUTTON"):
+            for button in component.get("buttons") or [component]:
+                button_type = (button.get("type") or "").lower()
+                if button_type == "url" and count_params(button.get("url")):
+                    compact["buttons"].append("url")
+                elif button_type in ("copy_code", "otp"):
+                    compact["buttons"].append("code")
+                elif button_type == "phone_number":
+                    compact["phone_buttons"] += 1
+
+    return compact
+
+
+def sync_templates():
+    """
+    Pulls the template definitions of every WhatsApp Number's instance from the gateway
+    into WhatsApp Template. New templates are created, known ones are updated in place,
+    and templates the gateway no longer lists are marked Missing.
+    """
+    client = get_gateway_client()
+    synced_on = now_datetime()
+
+    for number in frappe.get_all("WhatsApp Number", fields=["name", "instance_id"]):
+        try:
+            data = client.post(TEMPLATES_PATH, {"instance_id": number.instance_id})
+        except GatewayError as e:
+            frappe.log_error(
+                title="WhatsApp Template Sync Failed",
+                message=str(e),
+                reference_doctype="WhatsApp Number",
+                reference_name=number.name,
+            )
+            continue
+
+        seen = set()
+        for template in data.get("templates") or []:
+            name = template.get("name")
+            if not name or name in seen:
+                continue
+            seen.add(name)
+
+            languages = [
+                t.get("language") for t in data["templates"] if t.get("name") == name and t.get("language")
+            ]
+            compact = compact_definition(template)
+
+            values = {
+                "language": ", ".join(languages),
+                "gateway_status": (template.get("status") or "").upper(),
+                "header_format": compact["header_format"],
+                "header_params": compact["header_params"],
+                "body_params": compact["body_params"],
+                "button_params": len(compact["buttons"]),
+                "definition": json.dumps(template, sort_keys=True, ensure_ascii=False),
+                "last_synced": synced_on,
+            }
+
+            if frappe.db.exists("WhatsApp Template", name):
+                frappe.db.set_value("WhatsApp Template", name, values)
+            else:
+                frappe.get_doc({
+                    "doctype": "WhatsApp Template",
+                    "template_name": name,
+                    "whatsapp_number": number.name,
+                    "is_active": values["gateway_status"] == "APPROVED",
+                    **values,
+                }).insert(ignore_permissions=True)
+
+        frappe.db.sql("""
+            UPDATE `tabWhatsApp Template`
+            SET gateway_status = 'MISSING'
+            WHERE whatsapp_number = %(number)s
+                AND last_synced IS NOT NULL
+                AND name NOT IN %(seen)s
+        """, {"number": number.name, "seen": tuple(seen) or ("",)})
+
+        frappe.db.commit()
+
+    clear_template_registry()
+
+
+@frappe.whitelist()
+def enqueue_template_sync():
+    frappe.only_for("System Manager")
+
+    frappe.enqueue(
+        "salon.whatsapp.templates.sync_templates",
+        queue="long",
+        job_id="salon_whatsapp_template_sync",
+        deduplicate=True,
+    )
+
+
+def load_template_registry() -> dict:
+    registry = {}
+    for template in frappe.get_all(
+        "WhatsApp Template",
+        filters={"last_synced": ["is", "set"]},
+        fields=["name", "gateway_status", "definition"],
+    ):
+        registry[template.name] = {
+            "status": template.gateway_status,
+            **compact_definition(json.loads(template.definition or "{}")),
+        }
+
+    return registry
+
+
+def get_template_registry() -> dict:
+    """Compact definitions of every synced template, {name: {status, header_format, ...}}, from Redis."""
+    return frappe.cache.get_value(TEMPLATE_REGISTRY_CACHE_KEY, generator=load_template_registry)
+
+
+def clear_template_registry():
+    frappe.cache.delete_value(TEMPLATE_REGISTRY_CACHE_KEY)
+
+
+def check_components(template_name: str, components: list) -> str | None:
+    """
+    Checks a components payload against the template's synced definition.
+    Templates that were never synced are only checked for existence.
+
+    :return: the first problem found, or None when the payload can be sent
+    """
+    definition = get_template_registry().get(template_name)
+    if not definition:
+        if not frappe.db.exists("WhatsApp Template", template_name):
+            return f"WhatsApp Template {template_name} does not exist"
+        return None
+
+    if definition["status"] != "APPROVED":
+        return f"WhatsApp Template {template_name} is {definition['status'] or 'not approved'}"
+
+    params = {component["section_name"]: component["params"] for component in components}
+
+    header = params.get("header", [])
+    if definition["header_format"] in MEDIA_FORMATS:
+        if len(header) != 1 or header[0]["type"] != definition["header_format"].lower():
+            return f"Template {template_name} needs one {definition['header_format'].lower()} header parameter"
+    elif len(header) != definition["header_params"]:
+        return f"Template {template_name} takes {definition['header_params']} header parameter(s), got {len(header)}"
+
+    body = params.get("body", [])
+    if len(body) != definition["body_params"]:
+        return f"Template {template_name} takes {definition['body_params']} body parameter(s), got {len(body)}"
+
+    buttons = [param["sub_type"] or "code" for param in params.get("button", [])]
+    parameterised = [button for button in buttons if button != "phone_number"]
+    if sorted(parameterised) != sorted(definition["buttons"]):
+        return f"Template {template_name} takes button parameters {definition['buttons']}, got {parameterised}"
+
+    phone_buttons = len(buttons) - len(parameterised)
+    if phone_buttons > definition.get("phone_buttons", 0):
+        return f"Template {template_name} has {definition.get('phone_buttons', 0)} phone number button(s), got {phone_buttons}"
+
+    return None
@@ -0,0 +1,54 @@
+# Copyright (c) 2026, salon and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from salon.whatsapp.catalog import load_service_catalog
+
+ITEM = "_T-CATALOG-SERVICE"
+
+
+def make_item_price(name, price_list, rate, modified):
+	## Raw inserts: the test only needs the columns the catalog query reads
+	frappe.get_doc(
+		{
+			"doctype": "Item Price",
+			"name": name,
+			"item_code": ITEM,
+			"price_list": price_list,
+			"price_list_rate": rate,
+			"selling": 1,
+			"modified": modified,
+		}
+	).db_insert()
+
+
+class TestServiceCatalog(FrappeTestCase):
+	def setUp(self):
+		frappe.db.delete("Item Price", {"item_code": ITEM})
+		frappe.db.delete("Item", {"name": ITEM})
+
+		frappe.get_doc(
+			{
+				"doctype": "Item",
+				"name": ITEM,
+				"item_code": ITEM,
+				"item_name": ITEM,
+				"item_group": "Services",
+			}
+		).db_insert()
+
+	def get_price(self):
+		return next(
+			service.vat_exclusive_price for service in load_service_catalog("en") if service.name == ITEM
+		)
+
+	def test_latest_selling_price_is_served(self):
+		make_item_price("_T-CATALOG-PRICE-1", "_T-Old Price List", 50, "2026-01-01 00:00:00")
+		make_item_price("_T-CATALOG-PRICE-2", "_T-New Price List", 80, "2026-02-01 00:00:00")
+
+		self.assertEqual(self.get_price(), 80)
+
+	def test_item_without_selling_price_is_unspecified(self):
+		self.assertEqual(self.get_price(), "Unspecified")
@@ -0,0 +1,115 @@
+# Copyright (c) 2026, salon and Contributors
+# See license.txt
+
+from frappe.tests.utils import FrappeTestCase
+
+from salon.whatsapp.dispatcher import ReminderDispatcher, batch_reminder_messages
+from salon.whatsapp.fake_gateway import FakeGateway
+from salon.whatsapp.gateway import GatewayClient
+
+
+def make_messages(count, instance_id="instance-1"):
+	return [
+		{
+			"key": f"APP-{i}",
+			"instance_id": instance_id,
+			"payload": {"instance_id": instance_id, "numbers": [f"96650000{i:04d}"]},
+		}
+		for i in range(count)
+	]
+
+
+def make_reminders(count, template_name="reminder", instance_id="instance-1"):
+	return [
+		{
+			"key": f"APP-{i}",
+			"instance_id": instance_id,
+			"template_name": template_name,
+			"number": f"96650000{i:04d}",
+			"components": [{"section_name": "body", "params": [{"type": "text", "text": f"*Customer {i}*"}]}],
+		}
+		for i in range(count)
+	]
+
+
+class TestReminderDispatcher(FrappeTestCase):
+	def test_dispatches_every_message(self):
+		with FakeGateway() as gateway:
+			dispatcher = ReminderDispatcher(GatewayClient(gateway.url, "key"), max_workers=4, rate_per_instance=1000)
+			outcomes = dispatcher.dispatch(make_messages(20))
+
+		self.assertTrue(all(outcome["success"] for outcome in outcomes))
+		self.assertEqual([outcome["key"] for outcome in outcomes], [f"APP-{i}" for i in range(20)])
+		self.assertEqual(gateway.count("init_broadcast"), 20)
+		self.assertEqual(gateway.count("submit_broadcast"), 20)
+
+	def test_retries_throttled_gateway_then_records_failure(self):
+		with FakeGateway(failure_rate=1, failure_status=429) as gateway:
+			dispatcher = ReminderDispatcher(
+				GatewayClient(gateway.url, "key"), rate_per_instance=1000, max_retries=2, backoff=0.01
+			)
+			outcomes = dispatcher.dispatch(make_messages(3))
+
+		for outcome in outcomes:
+			self.assertFalse(outcome["success"])
+			self.assertEqual(outcome["attempts"], 3)
+			self.assertIn("429", outcome["error"])
+
+	def test_init_is_not_retried_once_the_gateway_may_have_acted(self):
+		## A 503 can come after the broadcast was created; retrying could create a second one
+		with FakeGateway(failure_rate=1) as gateway:
+			dispatcher = ReminderDispatcher(
+				GatewayClient(gateway.url, "key"), rate_per_instance=1000, max_retries=2, backoff=0.01
+			)
+			outcomes = dispatcher.dispatch(make_messages(3))
+
+		for outcome in outcomes:
+			self.assertFalse(outcome["success"])
+			self.assertEqual(outcome["attempts"], 1)
+			self.assertIn("503", outcome["error"])
+		self.assertEqual(gateway.count("init_broadcast"), 3)
+
+	def test_unexpected_errors_become_outcomes(self):
+		class BrokenClient:
+			def post(self, path, payload):
+				raise KeyError("message")
+
+		outcomes = ReminderDispatcher(BrokenClient(), rate_per_instance=1000).dispatch(make_messages(2))
+
+		self.assertEqual([outcome["key"] for outcome in outcomes], ["APP-0", "APP-1"])
+		self.assertTrue(all("KeyError" in outcome["error"] for outcome in outcomes))
+
+
+class TestBatchReminderMessages(FrappeTestCase):
+	def test_groups_by_template_and_instance_with_recipient_params(self):
+		reminders = (
+			make_reminders(250)
+			+ make_reminders(10, template_name="follow_up")
+			+ make_reminders(5, instance_id="instance-2")
+		)
+		messages = batch_reminder_messages(reminders, per_recipient_params=True, batch_size=100)
+
+		self.assertEqual([len(message["key"]) for message in messages], [100, 100, 50, 10, 5])
+		first = messages[0]["payload"]
+		self.assertEqual(len(first["recipients"]), 100)
+		self.assertEqual(first["recipients"][1]["components"], reminders[1]["components"])
+		## Customer 0's parameters must never reach the other recipients
+		self.assertNotIn("components", first)
+
+	def test_only_identical_components_share_a_broadcast(self):
+		reminders = make_reminders(3)
+		reminders[2]["components"] = reminders[0]["components"]
+		messages = batch_reminder_messages(reminders, batch_size=100)
+
+		self.assertEqual([message["key"] for message in messages], [["APP-0", "APP-2"], ["APP-1"]])
+		self.assertNotIn("recipients", messages[0]["payload"])
+		self.assertEqual(messages[0]["payload"]["components"], reminders[0]["components"])
+
+	def test_batched_dispatch_cuts_round_trips(self):
+		messages = batch_reminder_messages(make_reminders(300), per_recipient_params=True, batch_size=100)
+		with FakeGateway() as gateway:
+			dispatcher = ReminderDispatcher(GatewayClient(gateway.url, "key"), rate_per_instance=1000)
+			outcomes = dispatcher.dispatch(messages)
+
+		self.assertEqual(sum(len(outcome["key"]) for outcome in outcomes if outcome["success"]), 300)
+		self.assertEqual(gateway.count("init_broadcast"), 3)
@@ -0,0 +1,55 @@
+# Copyright (c) 2026, salon and Contributors
+# See license.txt
+
+import requests
+from frappe.tests.utils import FrappeTestCase
+from requests.adapters import HTTPAdapter
+
+from salon.whatsapp.fake_gateway import FakeGateway
+from salon.whatsapp.gateway import GatewayClient, GatewayError, LatencyHistogram
+
+
+class TestGatewayClient(FrappeTestCase):
+	def test_pooled_session_reuses_connections(self):
+		session = requests.Session()
+		session.mount("http://", HTTPAdapter(pool_maxsize=2))
+
+		with FakeGateway() as gateway:
+			client = GatewayClient(gateway.url, "key", session=session, histogram=None)
+			for _ in range(10):
+				client.submit_broadcast("REF-1")
+
+		self.assertEqual(gateway.count("submit_broadcast"), 10)
+		self.assertEqual(gateway.connections, 1)
+
+	def test_unavailable_gateway_is_retryable(self):
+		with FakeGateway(failure_rate=1) as gateway:
+			client = GatewayClient(gateway.url, "key", histogram=None)
+			with self.assertRaises(GatewayError) as error:
+				client.init_broadcast({"numbers": []})
+
+		self.assertTrue(error.exception.retryable)
+
+	def test_non_dict_message_is_a_gateway_error(self):
+		with FakeGateway(reply_body={"message": "ok"}) as gateway:
+			client = GatewayClient(gateway.url, "key", histogram=None)
+			with self.assertRaises(GatewayError) as error:
+				client.submit_broadcast("REF-1")
+
+		self.assertEqual(str(error.exception), "ok")
+		self.assertFalse(error.exception.retryable)
+
+	def test_latencies_are_bucketed_per_endpoint(self):
+		histogram = LatencyHistogram(buckets=(100, 1000))
+		with FakeGateway() as gateway:
+			client = GatewayClient(gateway.url, "key", histogram=histogram)
+			client.submit_broadcast("REF-1")
+			client.submit_broadcast("REF-2")
+
+		histogram.observe("init_broadcast", 0.5)
+		counts = histogram.drain()
+
+		self.assertEqual(counts["submit_broadcast|count"], 2)
+		self.assertEqual(counts["submit_broadcast|le_100"], 2)
+		self.assertEqual(counts["init_broadcast|le_1000"], 1)
+		self.assertEqual(histogram.drain(), {})